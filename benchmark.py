@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Відтворюваний бенчмарк prime_solution.Solver на вхідних файлах prime_input_*.txt.
+
+Замість воркерів PARCS (Pyro4) використовуються локальні замінники:
+- inprocess - виклики методів Solver у тому ж процесі (з кругообігом
+  результату через serpent, якщо він встановлений, як у Pyro4);
+- process - окремий процес на кожного воркера, виклики передаються через pipe.
+
+Приклади:
+    python benchmark.py --workers 0,1,2,3 --backends bytearray,numpy --repeat 3 --output bench.json
+    python benchmark.py --inputs prime_input_1000000.txt --baseline bench.json --tolerance 0.15
+"""
+
+from __future__ import print_function
+
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import prime_solution
+from prime_solution import Solver, SIEVE_BACKENDS
+
+try:
+    import serpent
+except ImportError:
+    serpent = None
+
+TRANSPORTS = ("inprocess", "process")
+DEFAULT_MAX_RANGE = 10 ** 7
+
+
+class InProcessWorker(object):
+    """
+    Замінник Pyro4-проксі: викликає статичні методи Solver у цьому процесі.
+    З wire=True результат проходить serpent.dumps/loads, як при передачі через Pyro4.
+    """
+
+    def __init__(self, wire=True):
+        self.wire = wire and serpent is not None
+
+    def __getattr__(self, name):
+        method = getattr(Solver, name)
+
+        def call(*args):
+            result = method(*args)
+            if self.wire:
+                result = serpent.loads(serpent.dumps(result))
+            return result
+        return call
+
+    def close(self):
+        pass
+
+
+def _process_worker_loop(conn):
+    """Цикл процесу-воркера: виконує (ім'я методу, аргументи) і повертає результат."""
+    sys.stdout = open(os.devnull, 'w')
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        name, args = message
+        try:
+            conn.send(("ok", getattr(Solver, name)(*args)))
+        except Exception as e:
+            conn.send(("error", "%s: %s" % (type(e).__name__, str(e))))
+    conn.close()
+
+
+class ProcessWorker(object):
+    """
+    Замінник Pyro4-проксі в окремому процесі: аргументи і результат
+    серіалізуються (pickle) і передаються через pipe, як між вузлами.
+    Процес не є демоном, тож воркер може створювати власний пул процесів.
+    """
+
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_process_worker_loop, args=(child_conn,))
+        self.process.start()
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def call(*args):
+            with self.lock:
+                self.conn.send((name, args))
+                status, value = self.conn.recv()
+            if status != "ok":
+                raise RuntimeError("worker process failed in %s: %s" % (name, value))
+            return value
+        return call
+
+    def close(self):
+        self.conn.send(None)
+        self.process.join()
+
+
+def make_workers(transport, count, wire=True):
+    if transport == "process":
+        return [ProcessWorker() for _ in range(count)]
+    return [InProcessWorker(wire) for _ in range(count)]
+
+
+def find_inputs(patterns, max_range):
+    """Вхідні файли за шаблонами, відсортовані за розміром діапазону; start/end з перших рядків."""
+    paths = []
+    for pattern in patterns:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+    inputs = []
+    for path in paths:
+        values = []
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' not in line:
+                    values.append(int(line))
+        start, end = values[0], values[1]
+        if max_range and end - start + 1 > max_range:
+            print("Skipping %s: range %d exceeds --max-range %d" % (path, end - start + 1, max_range))
+            continue
+        inputs.append({"path": path, "name": os.path.basename(path), "start": start, "end": end})
+    inputs.sort(key=lambda item: (item["end"] - item["start"], item["name"]))
+    return inputs
+
+
+def count_primes_in_output(path):
+    """Кількість простих з вихідного файлу Solver."""
+    with open(path, 'r') as f:
+        text = f.read()
+    match = re.search(r"Total primes found: (\d+)", text)
+    if match:
+        return int(match.group(1))
+    return 0 if "No primes found" in text else None
+
+
+def run_once(item, workers, backend, transport, options, work_dir, wire=True, verbose=False):
+    """Один запуск Solver.solve; повертає (час у мс, кількість простих)."""
+    input_path = os.path.join(work_dir, "input.txt")
+    output_path = os.path.join(work_dir, "output.txt")
+    with open(input_path, 'w') as f:
+        f.write("%d\n%d\n%d\n" % (item["start"], item["end"], workers))
+        f.write("backend=%s\n" % backend)
+        # Кеші між запусками спотворили б виміри
+        f.write("segment_cache=none\ncost_profile=none\n")
+        for key, value in sorted(options.items()):
+            f.write("%s=%s\n" % (key, value))
+    stand_ins = make_workers(transport, workers, wire)
+    saved_stdout = sys.stdout
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        solver = Solver(stand_ins or None, input_path, output_path)
+        start_time = time.time()
+        solver.solve()
+        elapsed_ms = (time.time() - start_time) * 1000
+    finally:
+        if not verbose:
+            sys.stdout.close()
+            sys.stdout = saved_stdout
+        for worker in stand_ins:
+            worker.close()
+    return elapsed_ms, count_primes_in_output(output_path)
+
+
+def summarize(times):
+    ordered = sorted(times)
+    mean = sum(times) / len(times)
+    stdev = math.sqrt(sum((t - mean) ** 2 for t in times) / (len(times) - 1)) if len(times) > 1 else 0.0
+    return {
+        "times_ms": times,
+        "min_ms": ordered[0],
+        "median_ms": ordered[len(ordered) // 2] if len(ordered) % 2 else
+        (ordered[len(ordered) // 2 - 1] + ordered[len(ordered) // 2]) / 2.0,
+        "mean_ms": mean,
+        "stdev_ms": stdev,
+    }
+
+
+def result_key(result):
+    return (result["input"], result["workers"], result["backend"], result["transport"])
+
+
+def run_suite(args):
+    inputs = find_inputs(args.inputs, args.max_range)
+    options = dict(option.split("=", 1) for option in args.option)
+    work_dir = tempfile.mkdtemp(prefix="prime_bench_")
+    results = []
+    try:
+        for item in inputs:
+            for backend in args.backends:
+                sequential_median = None
+                for workers in args.workers:
+                    for _ in range(args.warmup):
+                        run_once(item, workers, backend, args.transport, options, work_dir, args.wire, args.verbose)
+                    times = []
+                    primes = None
+                    for _ in range(args.repeat):
+                        elapsed_ms, primes = run_once(item, workers, backend, args.transport, options, work_dir, args.wire, args.verbose)
+                        times.append(elapsed_ms)
+                    result = {"input": item["name"], "start": item["start"], "end": item["end"],
+                              "workers": workers, "backend": backend, "transport": args.transport,
+                              "primes": primes}
+                    result.update(summarize(times))
+                    if workers == 0:
+                        sequential_median = result["median_ms"]
+                    if sequential_median:
+                        result["speedup"] = sequential_median / result["median_ms"] if result["median_ms"] > 0 else None
+                    results.append(result)
+                    print("%-28s backend=%-9s workers=%d  median %10.3f ms  min %10.3f ms  stdev %8.3f ms  primes %s%s" %
+                          (item["name"], backend, workers, result["median_ms"], result["min_ms"], result["stdev_ms"],
+                           primes, "  speedup %.2fx" % result["speedup"] if result.get("speedup") else ""))
+            counts = set(r["primes"] for r in results if r["input"] == item["name"])
+            if len(counts) > 1:
+                print("ERROR: %s produced different prime counts across configurations: %s" % (item["name"], sorted(counts)))
+                sys.exit(2)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "numpy": prime_solution.np.__version__ if prime_solution.np is not None else None,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "options": options,
+            "wire": args.wire and serpent is not None,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Порівнює медіани з базовими; повертає список регресій."""
+    base = dict((result_key(r), r) for r in baseline["results"])
+    regressions = []
+    print("")
+    print("COMPARISON WITH BASELINE (tolerance %.1f%%):" % (tolerance * 100))
+    for result in report["results"]:
+        old = base.get(result_key(result))
+        if old is None:
+            print("  %-28s backend=%-9s workers=%d  no baseline" % (result["input"], result["backend"], result["workers"]))
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] > 0 else 1.0
+        status = "ok"
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions.append(result)
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        print("  %-28s backend=%-9s workers=%d  %10.3f ms -> %10.3f ms  (%+.1f%%)  %s" %
+              (result["input"], result["backend"], result["workers"], old["median_ms"], result["median_ms"],
+               (ratio - 1) * 100, status))
+    return regressions
+
+
+def parse_args(argv=None):
+    available = [name for name in SIEVE_BACKENDS if name != "numpy" or prime_solution.np is not None]
+    parser = argparse.ArgumentParser(description="Benchmark prime_solution.Solver on prime_input_* files")
+    parser.add_argument("--inputs", nargs="+", default=["prime_input_*.txt"],
+                        help="input files or glob patterns (default: prime_input_*.txt)")
+    parser.add_argument("--max-range", type=int, default=DEFAULT_MAX_RANGE,
+                        help="skip inputs with a larger range (0 - no limit, default: %d)" % DEFAULT_MAX_RANGE)
+    parser.add_argument("--workers", default="0,1,2,3",
+                        help="comma-separated worker counts, 0 - sequential path (default: 0,1,2,3)")
+    parser.add_argument("--backends", default=",".join(name for name in available if name != "python"),
+                        help="comma-separated sieve backends (available: %s)" % ", ".join(available))
+    parser.add_argument("--transport", choices=TRANSPORTS, default="inprocess",
+                        help="worker stand-in: in-process calls or one local process per worker")
+    parser.add_argument("--no-wire", dest="wire", action="store_false",
+                        help="skip the serpent round-trip of in-process results")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per configuration (default: 3)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per configuration (default: 1)")
+    parser.add_argument("--option", action="append", default=[],
+                        help="extra key=value line for the input file, e.g. encoding=varint (repeatable)")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed median slowdown before flagging a regression (default: 0.10)")
+    parser.add_argument("--verbose", action="store_true", help="show Solver output")
+    args = parser.parse_args(argv)
+    args.workers = [int(w) for w in args.workers.split(",")]
+    args.backends = [b for b in args.backends.split(",") if b]
+    for name in args.backends:
+        if name not in available:
+            parser.error("backend %s is not available (available: %s)" % (name, ", ".join(available)))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_suite(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("Results written to: %s" % args.output)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("%d regression(s) found" % len(regressions))
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
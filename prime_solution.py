@@ -4,10 +4,30 @@ Solution File для PARCS - пошук простих чисел у діапа
 Використовується для завантаження через веб-інтерфейс PARCS
 """
 
-from Pyro4 import expose
+from Pyro4 import expose, Proxy
+import os
 import math
 import time
+import mmap
+import copy
+import json
+import heapq
+import struct
+from bisect import bisect_left, bisect_right
+from collections import deque, OrderedDict, Counter
 import threading
+import multiprocessing
+import atexit
+import socket
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import shutil
+import binascii
+import base64
+from itertools import compress, islice
+from operator import sub
 
 
 try:
@@ -15,6 +35,2285 @@ try:
 except NameError:
     xrange = range  
 
+try:
+    from itertools import accumulate
+except ImportError:
+    def accumulate(iterable):
+        """Накопичувальні суми (аналог itertools.accumulate для Python 2)."""
+        total = 0
+        for value in iterable:
+            total += value
+            yield total
+
+# NumPy не обов'язковий: без нього використовується bytearray-бекенд решета
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Розмір сегмента для сегментованого решета (кількість чисел в одному блоці).
+# Підібрано так, щоб сегмент разом з базовими простими вміщувався у кеш процесора.
+SEGMENT_SIZE = 1 << 18
+
+# Режим високого зміщення: якщо √end більший за WINDOW_SIEVE_LIMIT (вікна за
+# ~1.7 * 10^13), вікно просіюється лише простими до PARTIAL_SIEVE_LIMIT, а
+# вцілілих кандидатів (~4.5%) перевіряє miller_rabin (детермінований до MR_DETERMINISTIC_LIMIT),
+# тож вартість залежить від ширини вікна, а не від end
+WINDOW_SIEVE_LIMIT = 1 << 22
+PARTIAL_SIEVE_LIMIT = 1 << 18
+
+# Потоковий reduce: чанк кожного воркера обробляється блоками не більше
+# STREAM_CHUNK_SIZE чисел, і майстер тримає в пам'яті не більше
+# MAX_PENDING_CHUNKS блоків, що прийшли не по порядку (решта - на диску).
+STREAM_CHUNK_SIZE = 1 << 22
+MAX_PENDING_CHUNKS = 4
+
+# Скільки рядків-простих чисел з'єднувати за один запис у файл
+WRITE_BLOCK = 100000
+
+# Трасування фаз (параметр trace=шлях): JSON зі спанами або формат Chrome trace
+# (trace_format=chrome, відкривається у chrome://tracing або Perfetto)
+TRACE_FORMATS = ("json", "chrome")
+
+# Кеш базових простих (BasePrimeCache): таблиця зберігається блоками по
+# BASE_BLOCK_SIZE чисел; понад BASE_CACHE_MAX_PRIMES простих витісняються
+# найдавніше використані блоки
+BASE_BLOCK_SIZE = 1 << 16
+BASE_CACHE_MAX_PRIMES = 1 << 20
+
+# Дисковий кеш результатів (SegmentCache, вмикається параметром segment_cache=<каталог>):
+# вирівняні блоки по SEGMENT_CACHE_BLOCK чисел (кратно 30) зберігаються бітами
+# колеса, 128 КіБ на блок, із заголовком (magic, версія, розмір блоку, номер блоку)
+SEGMENT_CACHE_BLOCK = 30 * (1 << 17)
+SEGMENT_CACHE_VERSION = 1
+SEGMENT_CACHE_MAGIC = b"PRIMESEG"
+SEGMENT_CACHE_HEADER = struct.Struct("<8sIIQ")  # magic, версія, чисел у блоці, номер блоку
+
+# Локальний пул процесів воркера (параметр local_processes, за замовчуванням -
+# кількість ядер): вікна, менші за LOCAL_POOL_MIN_RANGE, просіюються в одному процесі
+LOCAL_POOL_MIN_RANGE = 1 << 21
+
+# Планувальник паралельного режиму (параметр scheduler):
+# static - рівні послідовні чанки, по одному на воркера;
+# dynamic - спільна черга задач по grain чисел, воркер бере наступну, щойно звільнився;
+# costmodel - по одному чанку на воркера з межами за прогнозованою вартістю і швидкістю
+SCHEDULERS = ("static", "dynamic", "costmodel")
+DEFAULT_GRAIN = 1 << 20
+
+# Відмовостійкість паралельного режиму: скільки спроб дається блоку
+# (параметр retries), після скількох невдач поспіль воркер вважається
+# недоступним, у скільки разів довше за медіану (на одне число) має виконуватись
+# блок, щоб запустити його спекулятивну копію на іншому воркері
+# (параметр speculate, 0 - вимкнено), і мінімальний час до такого запуску
+MAX_TASK_ATTEMPTS = 3
+MAX_WORKER_FAILURES = 2
+SPECULATIVE_FACTOR = 3.0
+SPECULATIVE_MIN_MS = 1000
+# Як часто диспетчер перевіряє, чи з'явились повтори або відсталі блоки (с)
+SCHEDULER_POLL = 0.05
+# Скільки задач одночасно надсилається кожному воркеру (параметр inflight)
+PIPELINE_DEPTH = 2
+# Деревоподібний reduce (параметр fan_in, 0 - вимкнено): якщо воркерів більше
+# за fan_in, майстер звертається лише до fan_in кореневих, а кожен вузол ділить
+# свій діапазон між собою і не більше ніж fan_in дочірніми та зливає їхні
+# результати, перш ніж передати вгору. Методи, які можна виконувати деревом:
+DEFAULT_FAN_IN = 8
+TREE_METHODS = ("find_primes_in_range", "count_primes_in_range")
+# Конфігурація PARCS з таймаутом виклику воркера (параметр timeout перекриває)
+PARCS_CONFIG_FILE = "parcs_config.json"
+
+# Профіль швидкостей воркерів (JSON поруч із вихідним файлом, параметр cost_profile)
+COST_PROFILE_FILE = "worker_profile.json"
+# Вага нового виміру швидкості при оновленні профілю
+COST_PROFILE_SMOOTHING = 0.5
+# Кількість точок, якими інтегрується модель вартості
+COST_SAMPLES = 1024
+
+# Автотюнер (параметр tune=auto|recalibrate): кожен хост один раз вимірює
+# пропускну здатність бекендів решета для розмірів сегмента TUNE_SEGMENT_SIZES на
+# вікні з CALIBRATION_WINDOW чисел біля end; профіль (JSON поруч із вихідним
+# файлом, параметр tune_profile) зберігається окремо для кожного порядку end.
+# Задача dynamic-планувальника розрахована на ~TUNE_TASK_MS, але кожен воркер
+# отримує щонайменше TUNE_MIN_TASKS задач
+TUNE_MODES = ("off", "auto", "recalibrate")
+TUNING_PROFILE_FILE = "tuning_profile.json"
+TUNE_SEGMENT_SIZES = (1 << 15, 1 << 16, 1 << 17, 1 << 18, 1 << 19, 1 << 20)
+CALIBRATION_WINDOW = 1 << 20
+TUNE_TASK_MS = 250
+TUNE_MIN_TASKS = 4
+TUNE_MIN_GRAIN = 1 << 15
+
+# Двійковий формат результату (output_format=binary|both): дані - блоки по
+# BINARY_BLOCK_PRIMES простих у varint-різницях, індекс - перше просте
+# та зміщення кожного блоку (див. BinaryPrimeWriter / PrimeIndexReader)
+OUTPUT_FORMATS = ("text", "binary", "both")
+BINARY_BLOCK_PRIMES = 1024
+BINARY_FORMAT_VERSION = 1
+BINARY_DATA_MAGIC = b"PRIMEBIN"
+BINARY_INDEX_MAGIC = b"PRIMEIDX"
+BINARY_DATA_HEADER = struct.Struct("<8sII")     # magic, версія, простих у блоці
+BINARY_INDEX_HEADER = struct.Struct("<8sIIQQ")  # magic, версія, простих у блоці, кількість простих, кількість блоків
+BINARY_INDEX_ENTRY = struct.Struct("<QQ")       # перше просте блоку, зміщення блоку у файлі даних
+
+
+def isqrt(n):
+    """
+    Цілочисельний квадратний корінь: найбільше x, для якого x * x <= n.
+    Коригує результат math.sqrt, щоб уникнути похибок округлення для великих n.
+    """
+    if n < 0:
+        raise ValueError("isqrt() argument must be non-negative")
+    if n >= 1 << 104:
+        # Похибка float тут завелика для покрокового коригування: метод Ньютона
+        x = 1 << ((n.bit_length() + 1) // 2)
+        while True:
+            y = (x + n // x) // 2
+            if y >= x:
+                return x
+            x = y
+    x = int(math.sqrt(n))
+    while x * x > n:
+        x -= 1
+    while (x + 1) * (x + 1) <= n:
+        x += 1
+    return x
+
+
+def sieve_prime_limit(end):
+    """
+    Межа базових простих для вікна з кінцем end: √end, або PARTIAL_SIEVE_LIMIT
+    у режимі високого зміщення (√end > WINDOW_SIEVE_LIMIT), де решето лише
+    відсіює кандидатів, а їхню простоту перевіряє miller_rabin.
+    """
+    root = isqrt(max(end, 0))
+    return root if root <= WINDOW_SIEVE_LIMIT else PARTIAL_SIEVE_LIMIT
+
+
+def high_offset_label(end):
+    """Опис перевірки вцілілих кандидатів для заголовка ("Algorithm Used")."""
+    if end < MR_DETERMINISTIC_LIMIT:
+        return "partial sieve + deterministic Miller-Rabin"
+    return "partial sieve + Miller-Rabin (deterministic below 3.3e24) / BPSW probable-prime test above"
+
+
+class PythonSieveBackend(object):
+    """
+    Початкова реалізація решета на списках Python: кратні викреслюються
+    по одному індексу. Залишена як запасний варіант.
+    """
+    name = "python"
+
+    @staticmethod
+    def mark_segment(low, high, base_primes):
+        """Повертає прапорці простоти для чисел [low, high] (low >= 2)."""
+        size = high - low + 1
+        is_prime = [True] * size
+        for p in base_primes:
+            if p * p > high:
+                break
+            # Перше кратне p у сегменті, але не менше p * p
+            first = max(p * p, ((low + p - 1) // p) * p)
+            for j in xrange(first - low, size, p):
+                is_prime[j] = False
+        return is_prime
+
+    @staticmethod
+    def collect(is_prime, low):
+        """Повертає список простих чисел (int), позначених у сегменті."""
+        return [low + i for i in xrange(len(is_prime)) if is_prime[i]]
+
+    @staticmethod
+    def residue_plane(is_prime, first, step):
+        """Повертає прапорці is_prime[first::step] як байти 0/1."""
+        return bytearray(is_prime[first::step])
+
+    @staticmethod
+    def count_range(is_prime, i, j):
+        """Кількість простих серед is_prime[i:j]."""
+        return is_prime[i:j].count(True)
+
+
+class BytearraySieveBackend(object):
+    """
+    Решето на bytearray: кратні кожного простого викреслюються одним
+    присвоєнням зрізу, а прості збираються через itertools.compress.
+    """
+    name = "bytearray"
+
+    @staticmethod
+    def mark_segment(low, high, base_primes):
+        """Повертає прапорці простоти для чисел [low, high] (low >= 2)."""
+        size = high - low + 1
+        is_prime = bytearray(b"\x01") * size
+        for p in base_primes:
+            if p * p > high:
+                break
+            first = max(p * p, ((low + p - 1) // p) * p) - low
+            is_prime[first::p] = bytearray((size - 1 - first) // p + 1)
+        return is_prime
+
+    @staticmethod
+    def collect(is_prime, low):
+        """Повертає список простих чисел (int), позначених у сегменті."""
+        return list(compress(xrange(low, low + len(is_prime)), is_prime))
+
+    @staticmethod
+    def residue_plane(is_prime, first, step):
+        """Повертає прапорці is_prime[first::step] як байти 0/1."""
+        return is_prime[first::step]
+
+    @staticmethod
+    def count_range(is_prime, i, j):
+        """Кількість простих серед is_prime[i:j]."""
+        return is_prime.count(b"\x01", i, j)
+
+
+class NumpySieveBackend(object):
+    """
+    Решето на булевих масивах NumPy: викреслення зрізами,
+    збір простих чисел через np.flatnonzero.
+    """
+    name = "numpy"
+
+    @staticmethod
+    def mark_segment(low, high, base_primes):
+        """Повертає прапорці простоти для чисел [low, high] (low >= 2)."""
+        size = high - low + 1
+        is_prime = np.ones(size, dtype=np.bool_)
+        for p in base_primes:
+            if p * p > high:
+                break
+            first = max(p * p, ((low + p - 1) // p) * p) - low
+            is_prime[first::p] = False
+        return is_prime
+
+    @staticmethod
+    def collect(is_prime, low):
+        """Повертає список простих чисел (int), позначених у сегменті."""
+        if low + len(is_prime) > np.iinfo(np.int64).max:
+            # За межею int64 зсув додається до індексів як до цілих Python
+            return [low + i for i in np.flatnonzero(is_prime).tolist()]
+        return (np.flatnonzero(is_prime) + low).tolist()
+
+    @staticmethod
+    def residue_plane(is_prime, first, step):
+        """Повертає прапорці is_prime[first::step] як байти 0/1."""
+        return is_prime[first::step].tobytes()
+
+    @staticmethod
+    def count_range(is_prime, i, j):
+        """Кількість простих серед is_prime[i:j]."""
+        return int(np.count_nonzero(is_prime[i:j]))
+
+
+SIEVE_BACKENDS = {
+    PythonSieveBackend.name: PythonSieveBackend,
+    BytearraySieveBackend.name: BytearraySieveBackend,
+    NumpySieveBackend.name: NumpySieveBackend,
+}
+
+
+def get_sieve_backend(name=None):
+    """
+    Повертає бекенд решета за назвою ("numpy", "bytearray", "python").
+    Без назви (або "auto") обирає NumPy, якщо він встановлений, інакше bytearray.
+    """
+    if not name or name == "auto":
+        name = "numpy" if np is not None else "bytearray"
+    if name not in SIEVE_BACKENDS:
+        raise ValueError("Unknown sieve backend: %s" % name)
+    if name == "numpy" and np is None:
+        print("WARNING: NumPy is not installed, falling back to bytearray sieve backend")
+        name = "bytearray"
+    return SIEVE_BACKENDS[name]
+
+
+# Колесо за модулем 30: з кожних 30 чисел простими (крім 2, 3, 5) можуть бути
+# лише 8 чисел, взаємно простих з 30. Кожному залишку відповідає один біт байта.
+WHEEL_MODULUS = 30
+WHEEL_RESIDUES = (1, 7, 11, 13, 17, 19, 23, 29)
+WHEEL_SMALL_PRIMES = (2, 3, 5)
+WHEEL_BITS = dict((residue, bit) for bit, residue in enumerate(WHEEL_RESIDUES))
+
+# Таблиці для bytearray.translate: кількість одиничних бітів у байті
+# та виділення окремого біта (площини залишку) з кожного байта
+POPCOUNT_TABLE = bytes(bytearray(bin(i).count("1") for i in xrange(256)))
+WHEEL_PLANE_TABLES = [bytes(bytearray((i >> bit) & 1 for i in xrange(256))) for bit in xrange(8)]
+
+
+def _bytes_to_int(data):
+    """Перетворює байти (big-endian) у ціле число."""
+    if not data:
+        return 0
+    return int(binascii.hexlify(bytes(data)), 16)
+
+
+def _int_to_bytes(value, length):
+    """Перетворює ціле число у length байтів (big-endian)."""
+    if length == 0:
+        return b""
+    return binascii.unhexlify("%0*x" % (2 * length, value))
+
+
+class PackedWheelSieve(object):
+    """
+    Компактне сховище простих чисел вікна [start, end] на колесі mod 30:
+    один байт на кожні 30 чисел (біт на кожен залишок, взаємно простий з 30),
+    тобто ~0.27 біта на число замість посилання на об'єкт Python.
+    Прості 2, 3, 5 зберігаються окремо.
+    """
+
+    # Скільки байтів декодувати за раз під час ітерації
+    DECODE_CHUNK = 4096
+
+    def __init__(self, start, end, bits=None):
+        self.start = start
+        self.end = end
+        self.base = (max(start, 0) // WHEEL_MODULUS) * WHEEL_MODULUS
+        size = (end - self.base) // WHEEL_MODULUS + 1 if end >= self.base else 0
+        self.bits = bytearray(size) if bits is None else bits
+        self.small = [p for p in WHEEL_SMALL_PRIMES if start <= p <= end]
+
+    @classmethod
+    def from_primes(cls, start, end, primes):
+        """Пакує відсортовані прості числа вікна [start, end] у біти колеса."""
+        store = cls(start, end)
+        bits = store.bits
+        for p in primes:
+            if p > 5:
+                bits[(p - store.base) // WHEEL_MODULUS] |= 1 << WHEEL_BITS[p % WHEEL_MODULUS]
+        return store
+
+    def window(self, start, end):
+        """Підвікно [start, end] у межах [self.start, self.end] як новий PackedWheelSieve."""
+        sub = PackedWheelSieve(start, end)
+        k0 = (sub.base - self.base) // WHEEL_MODULUS
+        sub.bits[:] = self.bits[k0:k0 + len(sub.bits)]
+        # Крайні байти можуть містити біти чисел поза [start, end]
+        for k in set([0, len(sub.bits) - 1]) if sub.bits else ():
+            n0 = sub.base + WHEEL_MODULUS * k
+            sub.bits[k] &= sum(1 << bit for bit, residue in enumerate(WHEEL_RESIDUES)
+                               if start <= n0 + residue <= end)
+        return sub
+
+    def add_segment(self, low, is_prime, backend):
+        """
+        Пакує прапорці простоти сегмента [low, low + len(is_prime) - 1]
+        (результат backend.mark_segment) у біти колеса.
+        """
+        size = len(is_prime)
+        for bit, residue in enumerate(WHEEL_RESIDUES):
+            first = low + (residue - low) % WHEEL_MODULUS
+            if first >= low + size:
+                continue
+            plane = backend.residue_plane(is_prime, first - low, WHEEL_MODULUS)
+            k0 = (first - self.base) // WHEEL_MODULUS
+            k1 = k0 + len(plane)
+            # Площина містить байти 0/1, тож зсув на bit не виходить за межі байта
+            merged = _bytes_to_int(self.bits[k0:k1]) | (_bytes_to_int(plane) << bit)
+            self.bits[k0:k1] = _int_to_bytes(merged, k1 - k0)
+
+    def count(self):
+        """Кількість простих чисел у вікні (підрахунок одиничних бітів)."""
+        return len(self.small) + sum(bytearray(self.bits.translate(POPCOUNT_TABLE)))
+
+    def __len__(self):
+        return self.count()
+
+    def decode(self, k_lo, k_hi):
+        """Повертає відсортований список простих чисел (int) з байтів [k_lo, k_hi)."""
+        chunk = self.bits[k_lo:k_hi]
+        n0 = self.base + WHEEL_MODULUS * k_lo
+        span = WHEEL_MODULUS * len(chunk)
+        primes = []
+        for bit, residue in enumerate(WHEEL_RESIDUES):
+            plane = chunk.translate(WHEEL_PLANE_TABLES[bit])
+            primes.extend(compress(xrange(n0 + residue, n0 + residue + span, WHEEL_MODULUS), plane))
+        primes.sort()
+        return primes
+
+    def iter_chunks(self):
+        """Видає відсортовані списки простих чисел порціями по DECODE_CHUNK байтів."""
+        if self.small:
+            yield list(self.small)
+        for k in xrange(0, len(self.bits), self.DECODE_CHUNK):
+            chunk = self.decode(k, k + self.DECODE_CHUNK)
+            if chunk:
+                yield chunk
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            for p in chunk:
+                yield p
+
+    def first(self):
+        """Найменше просте число у вікні або None."""
+        for chunk in self.iter_chunks():
+            return chunk[0]
+        return None
+
+    def last(self):
+        """Найбільше просте число у вікні або None."""
+        k = len(self.bits.rstrip(b"\x00"))
+        if k > 0:
+            return self.decode(k - 1, k)[-1]
+        return self.small[-1] if self.small else None
+
+
+# Формати результату воркера (див. encode_prime_result):
+# "text"   - список рядків (початковий формат)
+# "varint" - різниці між сусідніми простими, закодовані varint
+# "bitmap" - байти PackedWheelSieve (біти колеса mod 30)
+RESULT_ENCODINGS = ("text", "varint", "bitmap")
+
+# mode=stats: воркер повертає замість простих зведення (encoding "stats",
+# див. prime_stats); модулі класів лишків задаються параметром stats_moduli
+STATS_ENCODING = "stats"
+STATS_MODULI = (4, 6, 10)
+
+
+def encode_varint(values):
+    """Кодує невід'ємні цілі числа у varint (7 біт на байт, старший біт - продовження)."""
+    values = list(values)
+    if not values or max(values) < 0x80:
+        return bytearray(values)
+    out = bytearray()
+    for value in values:
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return out
+
+
+def iter_varint(data):
+    """Ліниво декодує послідовність varint з байтів."""
+    if not data or max(data) < 0x80:
+        for value in bytearray(data):
+            yield value
+        return
+    value = 0
+    shift = 0
+    for byte in bytearray(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = 0
+            shift = 0
+
+
+def encode_prime_gaps(chunks, base):
+    """
+    Кодує відсортовані порції простих чисел у varint-різниці:
+    перше значення - відступ першого простого від base, далі різниці між сусідніми.
+    Повертає кортеж (data, count, first, last).
+    """
+    data = bytearray()
+    count = 0
+    first = None
+    prev = base
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if first is None:
+            first = chunk[0]
+        data += encode_varint([chunk[0] - prev] + [b - a for a, b in zip(chunk, chunk[1:])])
+        prev = chunk[-1]
+        count += len(chunk)
+    return data, count, first, (prev if count else None)
+
+
+def iter_list_chunks(iterable, size=WRITE_BLOCK):
+    """Розбиває ітератор на списки довжиною не більше size."""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def payload_bytes(data):
+    """
+    Повертає байти корисного навантаження результату.
+    Серіалізатор serpent (за замовчуванням у Pyro4) передає bytes як
+    словник {'data': <base64>, 'encoding': 'base64'}.
+    """
+    if isinstance(data, dict) and data.get("encoding") == "base64":
+        return bytearray(base64.b64decode(data["data"]))
+    return bytearray(data)
+
+
+def encode_prime_result(store, encoding, moduli=STATS_MODULI):
+    """
+    Кодує PackedWheelSieve у формат encoding.
+    Повертає кортеж (data, count, first, last).
+    """
+    if encoding == STATS_ENCODING:
+        return prime_stats(store, moduli)
+    if encoding == "text":
+        data = [str(p) for p in store]
+        count = len(data)
+        first = int(data[0]) if data else None
+        last = int(data[-1]) if data else None
+        return data, count, first, last
+    if encoding == "varint":
+        data, count, first, last = encode_prime_gaps(store.iter_chunks(), store.start)
+        return bytes(data), count, first, last
+    if encoding == "bitmap":
+        return bytes(store.bits), store.count(), store.first(), store.last()
+    raise ValueError("Unknown result encoding: %s" % encoding)
+
+
+def prime_stats(store, moduli=STATS_MODULI):
+    """
+    Зведення простих вікна для mode=stats: {"sum" - сума простих, "twins" -
+    кількість пар (p, p + 2), "max_gap" - найбільша різниця сусідніх простих,
+    "max_gap_start" - просте, після якого вона вперше трапляється, "residues" -
+    {модуль: {лишок: кількість}}} (ключі - рядки). Пари та різниці, що
+    перетинають межу вікна, враховує merge_prime_stats за first і last.
+    Повертає кортеж (data, count, first, last), як encode_prime_result.
+    """
+    total = 0
+    count = 0
+    twins = 0
+    max_gap = 0
+    max_gap_start = None
+    first = last = None
+    residues = [Counter() for _ in moduli]
+    for chunk in store.iter_chunks():
+        if first is None:
+            first = chunk[0]
+        sequence = chunk if last is None else [last] + chunk
+        gaps = list(map(sub, sequence[1:], sequence[:-1]))
+        if gaps:
+            twins += gaps.count(2)
+            gap = max(gaps)
+            if gap > max_gap:
+                max_gap = gap
+                max_gap_start = sequence[gaps.index(gap)]
+        for modulus, counter in zip(moduli, residues):
+            counter.update([p % modulus for p in chunk])
+        total += sum(chunk)
+        count += len(chunk)
+        last = chunk[-1]
+    data = {
+        "sum": total,
+        "twins": twins,
+        "max_gap": max_gap,
+        "max_gap_start": max_gap_start,
+        "residues": dict((str(modulus), dict((str(r), n) for r, n in counter.items()))
+                         for modulus, counter in zip(moduli, residues)),
+    }
+    return data, count, first, last
+
+
+class PrimeResult(object):
+    """
+    Результат одного воркера на майстрі. Закодовані дані декодуються ліниво:
+    прості числа перетворюються у рядки лише під час запису у вихідний файл.
+    """
+
+    def __init__(self, envelope):
+        self.encoding = envelope["encoding"]
+        self.start = int(envelope["start"])
+        self.end = int(envelope["end"])
+        self.count = int(envelope["count"])
+        self.first = envelope.get("first")
+        self.last = envelope.get("last")
+        self.backend = envelope.get("backend")
+        self.compute_ms = envelope.get("compute_ms", 0.0)
+        self.serialize_ms = envelope.get("serialize_ms", 0.0)
+        self.payload_bytes = envelope.get("payload_bytes", 0)
+        if self.encoding in ("text", STATS_ENCODING):
+            self.data = envelope["data"]
+        else:
+            self.data = payload_bytes(envelope["data"])
+
+    @classmethod
+    def from_list(cls, primes, start=0, end=0):
+        """Обгортка для результату у старому форматі (список рядків)."""
+        return cls({"encoding": "text", "start": start, "end": end, "count": len(primes),
+                    "first": int(primes[0]) if primes else None,
+                    "last": int(primes[-1]) if primes else None, "data": primes})
+
+    def __len__(self):
+        return self.count
+
+    def envelope(self):
+        """Конверт з полями результату (як у воркера), наприклад для merge_prime_stats."""
+        return {"encoding": self.encoding, "start": self.start, "end": self.end, "count": self.count,
+                "first": self.first, "last": self.last, "data": self.data, "backend": self.backend,
+                "compute_ms": self.compute_ms, "serialize_ms": self.serialize_ms,
+                "payload_bytes": self.payload_bytes}
+
+    def __iter__(self):
+        """Видає прості числа (int) у порядку зростання."""
+        if self.encoding == "text":
+            return (int(p) for p in self.data)
+        if self.encoding == "varint":
+            return (self.start + offset for offset in accumulate(iter_varint(self.data)))
+        return iter(PackedWheelSieve(self.start, self.end, self.data))
+
+    def strings(self):
+        """Видає прості числа у вигляді рядків для запису у файл."""
+        if self.encoding == "text":
+            return iter(self.data)
+        return (str(p) for p in self)
+
+
+def write_prime_strings(f, strings, written=0):
+    """
+    Записує прості числа (рядки) у файл через ", " порціями по WRITE_BLOCK.
+    written - скільки чисел уже записано у цей рядок (для роздільника).
+    Повертає загальну кількість записаних чисел.
+    """
+    strings = iter(strings)
+    block = list(islice(strings, WRITE_BLOCK))
+    while block:
+        if written:
+            f.write(', ')
+        f.write(', '.join(block))
+        written += len(block)
+        block = list(islice(strings, WRITE_BLOCK))
+    return written
+
+
+class BinaryPrimeWriter(object):
+    """
+    Записує прості числа у двійковий файл даних і розріджений індекс.
+    Файл даних: заголовок BINARY_DATA_HEADER, далі блоки по block_primes
+    простих; у блоці зберігаються varint-різниці для всіх простих, крім першого.
+    Файл індексу: заголовок BINARY_INDEX_HEADER і по одному запису
+    BINARY_INDEX_ENTRY (перше просте, зміщення блоку) на кожен блок.
+    Прості числа мають подаватися у порядку зростання.
+    """
+
+    def __init__(self, path, block_primes=BINARY_BLOCK_PRIMES):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.block_primes = block_primes
+        self.file = open(path, 'wb')
+        self.file.write(BINARY_DATA_HEADER.pack(BINARY_DATA_MAGIC, BINARY_FORMAT_VERSION, block_primes))
+        self.offset = BINARY_DATA_HEADER.size
+        self.entries = []
+        self.count = 0
+        self.prev = None
+
+    def write(self, primes):
+        """Дописує прості числа (int) у файл даних."""
+        for chunk in iter_list_chunks(primes):
+            i = 0
+            while i < len(chunk):
+                in_block = self.count % self.block_primes
+                if in_block == 0:
+                    # Перше просте нового блоку зберігається лише в індексі
+                    self.entries.append((chunk[i], self.offset))
+                    self.prev = chunk[i]
+                    self.count += 1
+                    i += 1
+                    continue
+                part = chunk[i:i + self.block_primes - in_block]
+                data = encode_varint([part[0] - self.prev] + [b - a for a, b in zip(part, part[1:])])
+                self.file.write(data)
+                self.offset += len(data)
+                self.prev = part[-1]
+                self.count += len(part)
+                i += len(part)
+
+    def close(self):
+        """Закриває файл даних і записує індекс."""
+        if self.file.closed:
+            return
+        self.file.close()
+        index = open(self.index_path, 'wb')
+        index.write(BINARY_INDEX_HEADER.pack(BINARY_INDEX_MAGIC, BINARY_FORMAT_VERSION,
+                                             self.block_primes, self.count, len(self.entries)))
+        for entry in self.entries:
+            index.write(BINARY_INDEX_ENTRY.pack(*entry))
+        index.close()
+
+
+class PrimeIndexReader(object):
+    """
+    Читає двійковий файл простих чисел (BinaryPrimeWriter) через mmap.
+    Індекс блоків завантажується у пам'ять, а дані декодуються лише для
+    потрібних блоків, тому запити не читають увесь файл.
+
+    Приклад:
+        reader = PrimeIndexReader("output.txt.bin")
+        reader.nth(1000)                 # 1000-те просте у файлі
+        list(reader.primes_between(10**7, 10**7 + 100))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        index = open(path + ".idx", 'rb')
+        magic, version, self.block_primes, self.count, blocks = BINARY_INDEX_HEADER.unpack(
+            index.read(BINARY_INDEX_HEADER.size))
+        if magic != BINARY_INDEX_MAGIC or version != BINARY_FORMAT_VERSION:
+            raise ValueError("Not a prime index file: %s.idx" % path)
+        entries = index.read(BINARY_INDEX_ENTRY.size * blocks)
+        index.close()
+        self.firsts = []
+        self.offsets = []
+        for k in xrange(blocks):
+            first, offset = BINARY_INDEX_ENTRY.unpack_from(entries, k * BINARY_INDEX_ENTRY.size)
+            self.firsts.append(first)
+            self.offsets.append(offset)
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, block_primes = BINARY_DATA_HEADER.unpack(self.data[:BINARY_DATA_HEADER.size])
+        if magic != BINARY_DATA_MAGIC or block_primes != self.block_primes:
+            raise ValueError("Not a prime data file: %s" % path)
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return self.count
+
+    def block(self, k):
+        """Повертає список простих чисел блоку k."""
+        primes = [self.firsts[k]]
+        primes.extend(self.firsts[k] + total for total in
+                       accumulate(iter_varint(bytearray(self.data[self.offsets[k]:self.offsets[k + 1]]))))
+        return primes
+
+    def __getitem__(self, i):
+        """i-те просте у файлі (з нуля)."""
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("prime index out of range")
+        return self.block(i // self.block_primes)[i % self.block_primes]
+
+    def nth(self, k):
+        """k-те просте у файлі (з одиниці)."""
+        return self[k - 1]
+
+    def primes_between(self, a, b):
+        """Видає прості числа з файлу, що належать [a, b]."""
+        k = max(bisect_right(self.firsts, a) - 1, 0)
+        while k < len(self.firsts) and self.firsts[k] <= b:
+            for p in self.block(k):
+                if p > b:
+                    return
+                if p >= a:
+                    yield p
+            k += 1
+
+    def __iter__(self):
+        for k in xrange(len(self.firsts)):
+            for p in self.block(k):
+                yield p
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OrderedResultWriter(object):
+    """
+    Потоковий reduce: передає результати блоків у вихідні файли у порядку
+    їх індексів, щойно всі попередні блоки готові. У пам'яті тримається не більше
+    max_pending блоків, що прийшли не по порядку; інші тимчасово
+    записуються на диск у форматі varint. Текстовий список пишеться у path
+    (якщо text=True), двійковий - через binary (BinaryPrimeWriter).
+    З sections=True для кожного блоку запам'ятовується його місце у файлі
+    та кількість простих до і після нього (див. copy_section).
+    Безпечний для виклику з кількох потоків.
+    """
+
+    def __init__(self, path, max_pending=MAX_PENDING_CHUNKS, text=True, binary=None, sections=False):
+        self.path = path
+        self.max_pending = max_pending
+        self.text = text
+        self.binary = binary
+        self.file = open(path, 'w') if text else None
+        self.next_index = 0
+        self.pending = {}   # index -> PrimeResult, що чекає на попередні блоки
+        self.spilled = {}   # index -> (шлях до тимчасового файлу, конверт без даних)
+        self.count = 0
+        self.spill_count = 0
+        self.max_buffered = 0
+        self.write_ms = 0.0
+        self.sections = {} if sections else None  # index -> (зміщення, кінець, простих до, простих після)
+        self.lock = threading.Lock()
+
+    def submit(self, index, result):
+        """Приймає результат блоку index і записує все, що вже можна записати по порядку."""
+        with self.lock:
+            if index == self.next_index or len(self.pending) < self.max_pending:
+                self.pending[index] = result
+                self._drain()
+                self.max_buffered = max(self.max_buffered, len(self.pending))
+                return
+        # Буфер заповнений: блок записується у тимчасовий файл поза блокуванням
+        spill_path = "%s.%d.spill" % (self.path, index)
+        data, count, first, last = encode_prime_gaps(iter_list_chunks(result), result.start)
+        spill_file = open(spill_path, 'wb')
+        spill_file.write(data)
+        spill_file.close()
+        envelope = {"encoding": "varint", "start": result.start, "end": result.end,
+                    "count": count, "first": first, "last": last}
+        with self.lock:
+            self.spilled[index] = (spill_path, envelope)
+            self.spill_count += 1
+            self._drain()
+
+    def _drain(self):
+        """Записує блоки, починаючи з next_index, доки вони є (викликається під lock)."""
+        write_start = time.time()
+        while True:
+            if self.next_index in self.pending:
+                result = self.pending.pop(self.next_index)
+            elif self.next_index in self.spilled:
+                spill_path, envelope = self.spilled.pop(self.next_index)
+                spill_file = open(spill_path, 'rb')
+                envelope["data"] = spill_file.read()
+                spill_file.close()
+                os.remove(spill_path)
+                result = PrimeResult(envelope)
+            else:
+                break
+            self._write(result)
+            self.next_index += 1
+        self.write_ms += (time.time() - write_start) * 1000
+
+    def _write(self, result):
+        count_before = self.count
+        offset = self.file.tell() if self.sections is not None and self.text else 0
+        if self.text:
+            self.count = write_prime_strings(self.file, result.strings(), self.count)
+        else:
+            self.count += len(result)
+        if self.binary is not None:
+            self.binary.write(result)
+        if self.sections is not None:
+            self.sections[self.next_index] = (offset, self.file.tell() if self.text else 0, count_before, self.count)
+
+    def section_count(self, first, last):
+        """Кількість простих у блоках first .. last."""
+        return self.sections[last][3] - self.sections[first][2]
+
+    def copy_section(self, f, first, last):
+        """
+        Копіює у файл f прості числа блоків first .. last (вони лежать у
+        тимчасовому файлі поспіль) без роздільника перед першим.
+        Повертає кількість скопійованих простих.
+        """
+        self.close()
+        offset, _, count_before, _ = self.sections[first]
+        end = self.sections[last][1]
+        count = self.section_count(first, last)
+        if count:
+            if count_before:
+                offset += len(', ')
+            body = open(self.path, 'r')
+            body.seek(offset)
+            remaining = end - offset
+            while remaining > 0:
+                data = body.read(min(remaining, 1 << 20))
+                if not data:
+                    break
+                f.write(data)
+                remaining -= len(data)
+            body.close()
+        return count
+
+    def close(self):
+        """Закриває тимчасовий текстовий файл і двійкові файли."""
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+        if self.binary is not None:
+            self.binary.close()
+
+    def copy_to(self, f):
+        """Копіює записані прості числа у вихідний файл f."""
+        self.close()
+        body = open(self.path, 'r')
+        shutil.copyfileobj(body, f)
+        body.close()
+
+    def cleanup(self):
+        """Видаляє тимчасові файли (двійкові файли результату залишаються)."""
+        self.close()
+        for spill_path, envelope in self.spilled.values():
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SegmentCache(object):
+    """
+    Дисковий кеш просіяних вирівняних блоків [k * block, (k + 1) * block - 1],
+    збережених бітами колеса mod 30 (файл на блок, запис через тимчасовий файл
+    і перейменування). Задача будь-якої форми береться з кешу, якщо всі блоки,
+    які вона зачіпає, вже є на диску. Результати задач накопичуються у
+    незавершених блоках і записуються, щойно блок покрито повністю, тож
+    перезапущене після збою завдання продовжує з останнього записаного блоку.
+    """
+
+    def __init__(self, path, block=SEGMENT_CACHE_BLOCK):
+        self.path = path
+        self.block = block
+        self.lock = threading.Lock()
+        self.partial = {}  # k -> [PackedWheelSieve блоку, покрито чисел]
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.bytes_reused = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def block_path(self, k):
+        return os.path.join(self.path, "%d_%d.seg" % (self.block, k))
+
+    def _header(self, k):
+        return SEGMENT_CACHE_HEADER.pack(SEGMENT_CACHE_MAGIC, SEGMENT_CACHE_VERSION, self.block, k)
+
+    def _read(self, k):
+        """
+        Біти блоку k або None, якщо блоку немає. Файл без очікуваного заголовка
+        (інша версія формату, чужий чи пошкоджений файл) вважається відсутнім.
+        """
+        try:
+            with open(self.block_path(k), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        header = self._header(k)
+        if data[:len(header)] != header or len(data) != len(header) + self.block // WHEEL_MODULUS:
+            return None
+        return bytearray(data[len(header):])
+
+    def lookup(self, start, end):
+        """PackedWheelSieve вікна [start, end] з кешу або None, якщо якогось блоку немає."""
+        first_block = max(start, 0) // self.block
+        last_block = end // self.block
+        bits = bytearray()
+        for k in xrange(first_block, last_block + 1):
+            data = self._read(k)
+            if data is None:
+                with self.lock:
+                    self.misses += 1
+                return None
+            bits += data
+        with self.lock:
+            self.hits += 1
+            self.bytes_reused += len(bits)
+        store = PackedWheelSieve(first_block * self.block, (last_block + 1) * self.block - 1, bits)
+        return store.window(start, end)
+
+    def store(self, result):
+        """Додає результат задачі (PrimeResult) у блоки кешу; повні блоки записуються на диск."""
+        if result.end < max(result.start, 0):
+            return
+        if result.encoding == "bitmap":
+            task = PackedWheelSieve(result.start, result.end, bytearray(result.data))
+        else:
+            task = PackedWheelSieve.from_primes(result.start, result.end, result)
+        for k in xrange(max(result.start, 0) // self.block, result.end // self.block + 1):
+            block_start = k * self.block
+            lo = max(result.start, block_start)
+            hi = min(result.end, block_start + self.block - 1)
+            piece = task.window(lo, hi)
+            with self.lock:
+                entry = self.partial.get(k)
+                if entry is None:
+                    entry = self.partial[k] = [PackedWheelSieve(block_start, block_start + self.block - 1), 0]
+                k0 = (piece.base - block_start) // WHEEL_MODULUS
+                k1 = k0 + len(piece.bits)
+                merged = _bytes_to_int(entry[0].bits[k0:k1]) | _bytes_to_int(piece.bits)
+                entry[0].bits[k0:k1] = _int_to_bytes(merged, k1 - k0)
+                # Числа 0 і 1 не бувають простими, тож покриття рахується від 2
+                entry[1] += max(hi - max(lo, 2) + 1, 0)
+                if entry[1] < self.block - (2 if k == 0 else 0):
+                    continue
+                del self.partial[k]
+                self.stored += 1
+            self._write(k, entry[0].bits)
+
+    def _write(self, k, bits):
+        path = self.block_path(k)
+        tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.current_thread().ident)
+        with open(tmp_path, 'wb') as f:
+            f.write(self._header(k))
+            f.write(bytes(bits))
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Windows не перезаписує існуючий файл; блок уже є в кеші
+            os.remove(tmp_path)
+
+    def summary(self):
+        return ("%d task hits, %d misses, %d blocks stored, %d bytes reused" %
+                (self.hits, self.misses, self.stored, self.bytes_reused))
+
+
+def cached_result(store, backend="cache"):
+    """Конверт результату (як у find_primes_in_range) для вікна, взятого з кешу."""
+    return PrimeResult({"encoding": "bitmap", "start": store.start, "end": store.end,
+                        "count": store.count(), "first": store.first(), "last": store.last(),
+                        "data": bytes(store.bits), "backend": backend})
+
+
+class BasePrimeCache(object):
+    """
+    Таблиця базових простих, спільна для всіх викликів у процесі воркера.
+    Зберігається блоками по block_size чисел: запит більшої межі досіює лише
+    відсутні блоки (кратними менших простих з цього ж кешу), а коли кеш
+    перевищує max_primes простих, витісняються найдавніше використані блоки.
+    Майстер може передати готову таблицю (export / load).
+    """
+
+    def __init__(self, max_primes=BASE_CACHE_MAX_PRIMES, block_size=BASE_BLOCK_SIZE):
+        self.max_primes = max_primes
+        self.block_size = block_size
+        self.lock = threading.RLock()
+        self.blocks = OrderedDict()  # номер блоку -> прості блоку, у порядку використання
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sieve_block(self, k):
+        """Прості блоку k, тобто з [k * block_size, (k + 1) * block_size)."""
+        low = k * self.block_size
+        high = low + self.block_size
+        is_prime = bytearray(b"\x01") * self.block_size
+        if k == 0:
+            # Перший блок просіюється самостійно, як у звичайному решеті
+            is_prime[0:2] = b"\x00\x00"
+            for i in xrange(2, isqrt(high - 1) + 1):
+                if is_prime[i]:
+                    is_prime[i * i::i] = bytearray((high - 1 - i * i) // i + 1)
+            return list(compress(xrange(high), is_prime))
+        for p in self.get(isqrt(high - 1)):
+            if p * p >= high:
+                break
+            first = max(p * p, (low + p - 1) // p * p)
+            if first < high:
+                is_prime[first - low::p] = bytearray((high - 1 - first) // p + 1)
+        return list(compress(xrange(low, high), is_prime))
+
+    def get(self, limit):
+        """
+        Усі прості до limit (і, можливо, трохи більші - до кінця останнього блоку)
+        у порядку зростання. Відсутні блоки досіюються і потрапляють у кеш.
+        """
+        if limit < 2:
+            return []
+        with self.lock:
+            needed = limit // self.block_size + 1
+            table = []
+            for k in xrange(needed):
+                block = self.blocks.pop(k, None)
+                if block is None:
+                    self.misses += 1
+                    block = self._sieve_block(k)
+                    self.size += len(block)
+                else:
+                    self.hits += 1
+                self.blocks[k] = block
+                table.extend(block)
+            self._evict(needed)
+            return table
+
+    def _evict(self, used):
+        """Витісняє найдавніше використані блоки, поки кеш перевищує max_primes."""
+        while self.size > self.max_primes and len(self.blocks) > used:
+            k, block = next(iter(self.blocks.items()))
+            del self.blocks[k]
+            self.size -= len(block)
+            self.evictions += 1
+
+    def export(self, limit):
+        """
+        Таблиця простих до limit для передачі воркерам: varint(межа) і varint-різниці.
+        Межа округлюється вгору до кінця блоку, бо load приймає лише повні блоки.
+        """
+        limit = (max(limit, 0) // self.block_size + 1) * self.block_size - 1
+        primes = self.get(limit)
+        primes = primes[:bisect_right(primes, limit)]
+        return bytes(encode_varint([limit] + [b - a for a, b in zip([0] + primes, primes)]))
+
+    def load(self, data):
+        """Додає у кеш блоки з таблиці, отриманої від майстра (див. export)."""
+        values = iter_varint(payload_bytes(data))
+        limit = next(values, 0)
+        primes = list(accumulate(values))
+        with self.lock:
+            for k in xrange((limit + 1) // self.block_size):
+                if k not in self.blocks:
+                    low = k * self.block_size
+                    block = primes[bisect_right(primes, low - 1):bisect_right(primes, low + self.block_size - 1)]
+                    self.blocks[k] = block
+                    self.size += len(block)
+            self._evict(0)
+
+    def stats(self):
+        return ("%d primes in %d blocks, %d block hits, %d misses, %d evicted" %
+                (self.size, len(self.blocks), self.hits, self.misses, self.evictions))
+
+
+# Кеш базових простих процесу (воркера або майстра)
+BASE_PRIMES = BasePrimeCache()
+
+
+# Пул процесів (pool, processes, base_limit), спільний для всіх викликів
+# find_primes_in_range цього процесу, і таблиця базових простих у процесі пулу
+_local_pool = None
+_local_pool_lock = threading.Lock()
+_pool_base_primes = None
+
+
+def _init_local_pool(base_primes):
+    """Ініціалізатор процесу пулу: таблиця базових простих передається один раз."""
+    global _pool_base_primes
+    _pool_base_primes = base_primes
+
+
+def _sieve_subrange(args):
+    """
+    Просіює [lo, hi] у процесі пулу; повертає упаковані біти і час просіювання.
+    limit - межа базових простих усього вікна (sieve_prime_limit його кінця),
+    щоб усі частини вікна просіювались в одному режимі.
+    """
+    lo, hi, backend_name, segment_size, limit = args
+    start_time = time.time()
+    base_primes = _pool_base_primes[:bisect_right(_pool_base_primes, limit)]
+    store = Solver.sieve_packed(lo, hi, segment_size, backend_name, base_primes, limit)
+    return lo, hi, bytes(store.bits), (time.time() - start_time) * 1000, os.getpid()
+
+
+def local_process_count(processes=None):
+    """Кількість процесів локального пулу: задана або кількість ядер."""
+    if processes:
+        return max(int(processes), 1)
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def get_local_pool(processes, limit):
+    """
+    Пул щонайменше з processes процесів, у яких є базові прості щонайменше
+    до limit. Таблиця будується з запасом (до 2 * limit), щоб вищі вікна
+    наступних викликів не вимагали нового пулу, а пул з більшою кількістю
+    процесів використовується і для менших запитів (задач стільки ж, скільки
+    запитано процесів), тож чергування local_processes не перебудовує його.
+    Старий пул закривається і очікується поза блокуванням: його поточні
+    задачі (інших потоків) завершуються до звільнення процесів.
+    """
+    global _local_pool
+    old_pool = None
+    with _local_pool_lock:
+        if _local_pool is not None:
+            pool, pool_processes, pool_limit = _local_pool
+            if pool_processes >= processes and pool_limit >= limit:
+                return pool
+            old_pool = pool
+            old_pool.close()
+            processes = max(processes, pool_processes)
+            limit = max(limit, pool_limit // 2)
+        pool_limit = 2 * limit
+        pool = multiprocessing.Pool(processes, _init_local_pool, (Solver.base_primes(pool_limit),))
+        _local_pool = (pool, processes, pool_limit)
+    if old_pool is not None:
+        old_pool.join()
+    return pool
+
+
+def _terminate_local_pool():
+    """Зупиняє процеси локального пулу при завершенні інтерпретатора."""
+    global _local_pool
+    with _local_pool_lock:
+        if _local_pool is None:
+            return
+        pool = _local_pool[0]
+        _local_pool = None
+    pool.terminate()
+    pool.join()
+
+
+atexit.register(_terminate_local_pool)
+
+
+def split_range(start, end, parts):
+    """
+    Ділить [start, end] на parts послідовних чанків майже рівного розміру
+    (залишок розподіляється між першими чанками). Порожні чанки не повертаються.
+    """
+    total_range = end - start + 1
+    chunk_size = total_range // parts
+    remainder = total_range % parts
+    chunks = []
+    current_start = start
+    for i in xrange(parts):
+        current_chunk_size = chunk_size + (1 if i < remainder else 0)
+        if current_chunk_size <= 0 or current_start > end:
+            break
+        chunks.append((current_start, current_start + current_chunk_size - 1))
+        current_start += current_chunk_size
+    return chunks
+
+
+def split_blocks(start, end, size, first_index=0):
+    """Ділить [start, end] на задачі (index, block_start, block_end) не більше size чисел."""
+    return [(first_index + k, block_start, min(block_start + size - 1, end))
+            for k, block_start in enumerate(xrange(start, end + 1, size))]
+
+
+def parse_ranges(text):
+    """Розбирає "a-b, c-d ..." (параметр range) у список пар (a, b)."""
+    ranges = []
+    for token in text.replace(',', ' ').split():
+        bounds = token.split('-')
+        if len(bounds) != 2:
+            raise ValueError("Invalid range: %s (expected start-end)" % token)
+        ranges.append((int(bounds[0]), int(bounds[1])))
+    return ranges
+
+
+def range_pieces(ranges):
+    """
+    Об'єднання діапазонів ranges (ті, що перетинаються чи стикуються, зливаються),
+    розрізане на межах кожного діапазону: кожен відрізок (lo, hi) лежить
+    цілком усередині або цілком поза кожним з ranges. Відрізки відсортовані.
+    """
+    ranges = sorted((a, b) for a, b in ranges if a <= b)
+    cuts = sorted(set([a for a, _ in ranges] + [b + 1 for _, b in ranges]))
+    pieces = []
+    covered_end = None
+    for a, b in ranges:
+        lo = a if covered_end is None else max(a, covered_end + 1)
+        if lo > b:
+            continue
+        k = bisect_right(cuts, lo)
+        while lo <= b:
+            hi = min(cuts[k] - 1, b) if k < len(cuts) else b
+            pieces.append((lo, hi))
+            lo = hi + 1
+            k += 1
+        covered_end = b
+    return pieces
+
+
+def partition_tasks(tasks, speeds):
+    """
+    Ділить впорядкований список задач (index, start, end) на len(speeds)
+    послідовних груп так, щоб прогнозована вартість групи (range_cost) була
+    пропорційна швидкості воркера. Група може бути порожньою.
+    """
+    costs = [range_cost(lo, hi) for _, lo, hi in tasks]
+    total_cost = float(sum(costs))
+    total_speed = float(sum(speeds))
+    groups = []
+    done = 0.0
+    share = 0.0
+    k = 0
+    for i, speed in enumerate(speeds):
+        share += speed
+        target = total_cost * share / total_speed
+        group = []
+        while k < len(tasks) and (i == len(speeds) - 1 or done + costs[k] / 2 <= target):
+            group.append(tasks[k])
+            done += costs[k]
+            k += 1
+        groups.append(group)
+    return groups
+
+
+class TaskScheduler(object):
+    """
+    Видає задачі (index, start, end) потокам воркерів і відстежує їх стан.
+    Зі списком assignment кожен воркер спершу виконує свої задачі (static),
+    інакше задачі беруться зі спільної черги, впорядкованої за index (dynamic).
+
+    Невдалий блок повертається у чергу повторів і виконується іншим воркером
+    (до max_attempts спроб); воркер після MAX_WORKER_FAILURES невдач поспіль
+    виводиться з роботи, а його задачі переходять іншим. Вільний воркер
+    запускає спекулятивну копію блоку, що виконується набагато довше за
+    медіану; перемагає перший результат (claim), а блок вважається
+    завершеним лише після запису результату (commit).
+    """
+
+    def __init__(self, num_workers, tasks=None, assignment=None,
+                 max_attempts=MAX_TASK_ATTEMPTS, speculate=SPECULATIVE_FACTOR):
+        self.cond = threading.Condition()
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+        self.speculate = speculate
+        self.assignment = None
+        all_tasks = list(tasks or [])
+        if assignment is not None:
+            self.assignment = [deque(worker_tasks) for worker_tasks in assignment]
+            all_tasks = [task for worker_tasks in assignment for task in worker_tasks]
+        self.queue = list(tasks or [])
+        heapq.heapify(self.queue)
+        self.retry_queue = []
+        self.remaining = set(task[0] for task in all_tasks)
+        self.claimed = set()
+        self.running = {}  # index -> {worker_idx: час запуску}
+        self.first_worker = {}
+        self.attempts = {}
+        self.excluded = {}  # index -> воркери, на яких блок завершився помилкою
+        self.speculated = set()
+        self.retired = set()
+        self.consecutive_failures = [0] * num_workers
+        self.rates = []  # мс на одне число для завершених блоків
+        self.error = None
+        self.task_counts = [0] * num_workers
+        self.busy_ms = [0.0] * num_workers
+        self.failures = 0
+        self.retries = 0
+        self.speculative = 0
+        self.speculative_wins = 0
+
+    def _eligible(self, worker_idx, task):
+        """Чи може воркер взяти повтор блоку (не той, на якому блок уже падав, якщо є інші)."""
+        excluded = self.excluded.get(task[0], ())
+        if worker_idx not in excluded:
+            return True
+        live = [w for w in xrange(self.num_workers) if w not in self.retired]
+        return all(w in excluded for w in live)
+
+    def _take(self, worker_idx):
+        if self.assignment is not None and self.assignment[worker_idx]:
+            return self.assignment[worker_idx].popleft()
+        if self.queue:
+            return heapq.heappop(self.queue)
+        for task in sorted(self.retry_queue):
+            if task[0] not in self.remaining or task[0] in self.claimed:
+                self.retry_queue.remove(task)
+            elif self._eligible(worker_idx, task):
+                self.retry_queue.remove(task)
+                return task
+        return None
+
+    def _straggler(self, worker_idx):
+        """Блок, що виконується набагато довше за медіану, для спекулятивної копії."""
+        if self.speculate <= 0 or not self.rates:
+            return None
+        median_rate = sorted(self.rates)[len(self.rates) // 2]
+        now = time.time()
+        for index in sorted(self.running):
+            runners = self.running[index]
+            if not runners or worker_idx in runners or index in self.speculated:
+                continue
+            task = self.first_worker[index][1]
+            elapsed_ms = (now - min(runners.values())) * 1000
+            limit_ms = max(self.speculate * median_rate * (task[2] - task[1] + 1), SPECULATIVE_MIN_MS)
+            if elapsed_ms > limit_ms:
+                self.speculated.add(index)
+                self.speculative += 1
+                return task
+        return None
+
+    def next_task(self, worker_idx, wait=True):
+        """
+        Наступна задача для воркера. Якщо вільних задач немає, але інші ще
+        виконуються, чекає на повтори чи відсталі блоки (з wait=False одразу
+        повертає None); None - роботу завершено.
+        """
+        with self.cond:
+            while True:
+                if self.error is not None or not self.remaining or worker_idx in self.retired:
+                    return None
+                task = self._take(worker_idx)
+                if task is None:
+                    task = self._straggler(worker_idx)
+                if task is not None:
+                    self.running.setdefault(task[0], {})[worker_idx] = time.time()
+                    self.first_worker.setdefault(task[0], (worker_idx, task))
+                    self.task_counts[worker_idx] += 1
+                    return task
+                if not wait:
+                    return None
+                self.cond.wait(SCHEDULER_POLL)
+
+    def finished(self):
+        """Чи всі блоки записані (або виконання перервано)."""
+        with self.cond:
+            return not self.remaining or self.error is not None
+
+    def task_done(self, worker_idx, task, elapsed_ms, busy_ms=None):
+        """
+        Фіксує результат воркера. Повертає True, якщо це перший результат блоку
+        (його треба записати і підтвердити через commit), False - якщо блок
+        уже виконав інший воркер. busy_ms - приріст часу зайнятості воркера
+        (за замовчуванням elapsed_ms; при кількох задачах у польоті - менший).
+        """
+        with self.cond:
+            self.busy_ms[worker_idx] += elapsed_ms if busy_ms is None else busy_ms
+            self.consecutive_failures[worker_idx] = 0
+            self.running.get(task[0], {}).pop(worker_idx, None)
+            if task[0] not in self.remaining or task[0] in self.claimed or self.error is not None:
+                return False
+            self.claimed.add(task[0])
+            self.running.pop(task[0], None)
+            self.rates.append(elapsed_ms / (task[2] - task[1] + 1))
+            if task[0] in self.speculated and self.first_worker[task[0]][0] != worker_idx:
+                self.speculative_wins += 1
+            return True
+
+    def commit_cached(self, worker_idx, task):
+        """
+        Фіксує блок, взятий з кешу сегментів, без запису швидкості: миттєвий
+        "результат" не повинен зсувати медіану, за якою шукаються відсталі блоки.
+        Повертає True, якщо блок ще не завершено (результат треба записати і
+        підтвердити через commit).
+        """
+        with self.cond:
+            self.running.get(task[0], {}).pop(worker_idx, None)
+            if task[0] not in self.remaining or task[0] in self.claimed or self.error is not None:
+                return False
+            self.claimed.add(task[0])
+            self.running.pop(task[0], None)
+            return True
+
+    def commit(self, task):
+        """Позначає блок завершеним після запису його результату."""
+        with self.cond:
+            self.remaining.discard(task[0])
+            self.cond.notify_all()
+
+    def task_failed(self, worker_idx, task, elapsed_ms):
+        """Фіксує помилку воркера: блок іде на повтор, воркер може бути виведений з роботи."""
+        with self.cond:
+            self.busy_ms[worker_idx] += elapsed_ms
+            self.failures += 1
+            self.running.get(task[0], {}).pop(worker_idx, None)
+            self.excluded.setdefault(task[0], set()).add(worker_idx)
+            self.consecutive_failures[worker_idx] += 1
+            if self.consecutive_failures[worker_idx] >= MAX_WORKER_FAILURES and worker_idx not in self.retired:
+                self.retired.add(worker_idx)
+                if self.assignment is not None:
+                    self.retry_queue.extend(self.assignment[worker_idx])
+                    self.assignment[worker_idx].clear()
+                print("Worker %d retired after %d consecutive failures" % (worker_idx, self.consecutive_failures[worker_idx]))
+            if task[0] in self.remaining and task[0] not in self.claimed and not self.running.get(task[0]):
+                self.attempts[task[0]] = self.attempts.get(task[0], 0) + 1
+                if self.attempts[task[0]] >= self.max_attempts:
+                    self.abort("Block [%d, %d] failed after %d attempts" % (task[1], task[2], self.attempts[task[0]]))
+                else:
+                    self.retry_queue.append(task)
+                    self.retries += 1
+            if len(self.retired) == self.num_workers and self.remaining:
+                self.abort("All workers failed; %d blocks left unfinished" % len(self.remaining))
+            self.cond.notify_all()
+
+    def abort(self, message):
+        """Зупиняє видачу задач; solve завершиться помилкою message."""
+        with self.cond:
+            if self.error is None:
+                self.error = message
+            self.cond.notify_all()
+
+    def idle_ms(self, worker_idx, total_ms):
+        """Час простою воркера за total_ms роботи map-фази."""
+        return max(total_ms - self.busy_ms[worker_idx], 0.0)
+
+    def summary(self):
+        return ("%d failed calls, %d retries, %d speculative copies (%d won), %d workers retired" %
+                (self.failures, self.retries, self.speculative, self.speculative_wins, len(self.retired)))
+
+
+class AsyncChannel(object):
+    """
+    Асинхронні виклики одного воркера: результат або виняток кожного виклику
+    кладеться у чергу completions як (tag, value, error). Pyro4-проксі
+    переводиться в асинхронний режим (копія проксі з _pyroAsync): виклик
+    повертає FutureResult і виконується у власному з'єднанні, а результат
+    приходить через then / iferror. Інші об'єкти (локальні замінники воркерів)
+    викликаються в depth фонових потоках.
+    """
+
+    def __init__(self, worker, completions, depth=PIPELINE_DEPTH):
+        self.worker = worker
+        self.completions = completions
+        self.depth = depth
+        self.proxy = None
+        self.calls = None
+        if hasattr(worker, "_pyroAsync"):
+            self.proxy = copy.copy(worker)
+            self.proxy._pyroAsync()
+            self.kind = "pyro-async"
+        else:
+            self.calls = queue.Queue()
+            for _ in xrange(depth):
+                thread = threading.Thread(target=self._serve)
+                thread.daemon = True
+                thread.start()
+            self.kind = "thread"
+
+    def call(self, tag, method, *args):
+        """Запускає виклик method(*args); завершення з'явиться у черзі з міткою tag."""
+        if self.calls is not None:
+            self.calls.put((tag, method, args))
+            return
+        reported = []
+        lock = threading.Lock()
+
+        def report(value, error):
+            with lock:
+                if reported:
+                    return
+                reported.append(True)
+            self.completions.put((tag, value, error))
+
+        def on_value(value):
+            # Якщо результат надійшов до then, FutureResult одразу передає сюди
+            # і виняток - загорнутим у _ExceptionWrapper, а iferror не викликає
+            if hasattr(value, "raiseIt"):
+                report(None, value.exception)
+            else:
+                report(value, None)
+
+        future = getattr(self.proxy, method)(*args)
+        future.iferror(lambda error: report(None, error))
+        future.then(on_value)
+
+    def close(self):
+        """Зупиняє фонові потоки після завершення викликів, що вже в черзі."""
+        if self.calls is not None:
+            for _ in xrange(self.depth):
+                self.calls.put(None)
+
+    def _serve(self):
+        while True:
+            item = self.calls.get()
+            if item is None:
+                return
+            tag, method, args = item
+            try:
+                value = getattr(self.worker, method)(*args)
+                if hasattr(value, 'value'):
+                    value = value.value
+            except Exception as e:
+                self.completions.put((tag, None, e))
+                continue
+            self.completions.put((tag, value, None))
+
+
+def sieve_cost_density(x, segment_size=SEGMENT_SIZE):
+    """
+    Прогнозована вартість сегментованого решета на одне число поблизу x
+    (умовні одиниці): прохід по сегменту, викреслення кратних
+    (сума 1/p для p <= sqrt(x) ~ ln ln sqrt(x)), перебір базових простих
+    у кожному сегменті (~pi(sqrt(x)) / segment_size) і серіалізація
+    знайдених простих (~1 / ln x).
+    """
+    root = max(isqrt(max(x, 0)), 3)
+    return (1.0 + math.log(math.log(root)) + root / math.log(root) / segment_size +
+            4.0 / math.log(max(x, 3)))
+
+
+def range_cost(start, end, density=sieve_cost_density, samples=8):
+    """Прогнозована вартість діапазону [start, end] (інтеграл density методом середніх точок)."""
+    if end < start:
+        return 0.0
+    width = float(end - start + 1) / samples
+    return sum(density(int(start + (k + 0.5) * width)) for k in xrange(samples)) * width
+
+
+def cost_partition(start, end, speeds, density=sieve_cost_density, samples=COST_SAMPLES):
+    """
+    Ділить [start, end] на len(speeds) послідовних чанків так, щоб прогнозований
+    час кожного воркера (вартість чанку / швидкість) був однаковим.
+    Повертає список (chunk_start, chunk_end) для кожного воркера;
+    чанк з chunk_start > chunk_end порожній.
+    """
+    total_range = end - start + 1
+    samples = max(1, min(samples, total_range))
+    points = [start + total_range * k // samples for k in xrange(samples + 1)]
+    cumulative = [0.0]
+    for k in xrange(samples):
+        cumulative.append(cumulative[-1] + range_cost(points[k], points[k + 1] - 1, density, 1))
+    total_speed = float(sum(speeds))
+    chunks = []
+    chunk_start = start
+    share = 0.0
+    k = 0
+    for i, speed in enumerate(speeds):
+        share += speed
+        if i == len(speeds) - 1:
+            boundary = end + 1
+        else:
+            target = cumulative[-1] * share / total_speed
+            while k < samples - 1 and cumulative[k + 1] < target:
+                k += 1
+            piece = cumulative[k + 1] - cumulative[k]
+            fraction = (target - cumulative[k]) / piece if piece > 0 else 0.0
+            boundary = points[k] + int((points[k + 1] - points[k]) * min(max(fraction, 0.0), 1.0))
+            boundary = min(max(boundary, chunk_start), end + 1)
+        chunks.append((chunk_start, boundary - 1))
+        chunk_start = boundary
+    return chunks
+
+
+def build_reduce_tree(count, fan_in):
+    """
+    Дерево reduce над воркерами 0 .. count - 1 у порядку обходу в ширину:
+    корені 0 .. fan_in - 1, діти вузла i - fan_in * (i + 1) + j, j < fan_in.
+    Повертає список коренів; вузол - пара (індекс воркера, список дочірніх вузлів).
+    """
+    def node(i):
+        first = fan_in * (i + 1)
+        return (i, [node(c) for c in xrange(first, min(first + fan_in, count))])
+    return [node(i) for i in xrange(min(fan_in, count))]
+
+
+def tree_size(children):
+    """Кількість вузлів у піддереві з дочірніми children ([посилання, діти], ...) разом з коренем."""
+    return 1 + sum(tree_size(grandchildren) for _, grandchildren in children)
+
+
+def tree_depth(children):
+    """Кількість рівнів піддерева з дочірніми children разом з коренем."""
+    return 1 + max([tree_depth(grandchildren) for _, grandchildren in children] or [0])
+
+
+def aligned_partition(start, end, weights):
+    """
+    Ділить [start, end] на len(weights) послідовних частин пропорційно вартості
+    (cost_partition); внутрішні межі кратні 30, тож біти колеса частин
+    зшиваються побайтово. Частина з lo > hi порожня.
+    """
+    bounds = [start]
+    for chunk_start, _ in cost_partition(start, end, weights)[1:]:
+        bounds.append(max((chunk_start // WHEEL_MODULUS) * WHEEL_MODULUS, bounds[-1]))
+    bounds.append(end + 1)
+    return [(bounds[i], bounds[i + 1] - 1) for i in xrange(len(weights))]
+
+
+def merge_prime_envelopes(envelopes, start, end):
+    """
+    Зливає конверти find_primes_in_range сусідніх вікон (у порядку діапазону)
+    в один конверт для [start, end] без декодування простих: text - списки
+    з'єднуються, varint - перший відступ кожної частини перераховується від
+    останнього простого попередньої, bitmap - байти колеса зшиваються.
+    """
+    encoding = envelopes[0]["encoding"]
+    data = [] if encoding == "text" else bytearray()
+    count = 0
+    first = last = None
+    prev = start
+    payload_size = 0
+    for envelope in envelopes:
+        part_count = int(envelope["count"])
+        payload_size += envelope.get("payload_bytes", 0)
+        if encoding == "text":
+            data.extend(envelope["data"])
+        elif encoding == "bitmap":
+            data += payload_bytes(envelope["data"])
+        elif part_count:
+            part = payload_bytes(envelope["data"])
+            first_length = next(i for i, byte in enumerate(part) if byte < 0x80) + 1
+            data += encode_varint([int(envelope["first"]) - prev])
+            data += part[first_length:]
+        if part_count:
+            if first is None:
+                first = int(envelope["first"])
+            last = prev = int(envelope["last"])
+        count += part_count
+    if encoding != "text":
+        payload_size = len(data)
+        data = bytes(data)
+    return {
+        "encoding": encoding,
+        "start": start,
+        "end": end,
+        "count": count,
+        "first": first,
+        "last": last,
+        "data": data,
+        "backend": envelopes[0].get("backend"),
+        "compute_ms": max(envelope.get("compute_ms", 0.0) for envelope in envelopes),
+        "serialize_ms": sum(envelope.get("serialize_ms", 0.0) for envelope in envelopes),
+        "payload_bytes": payload_size,
+    }
+
+
+def merge_prime_stats(envelopes, start, end):
+    """
+    Зливає конверти-зведення (encoding "stats") сусідніх вікон у порядку
+    діапазону в одне зведення для [start, end]: суми й лишки додаються, а пара
+    близнюків і різниця на межі вікон відновлюються з last попереднього
+    і first наступного непорожнього вікна.
+    """
+    count = 0
+    first = last = None
+    total = 0
+    twins = 0
+    max_gap = 0
+    max_gap_start = None
+    residues = {}
+    for envelope in envelopes:
+        data = envelope["data"]
+        if int(envelope["count"]):
+            part_first = int(envelope["first"])
+            if last is not None:
+                # Різниця на межі передує різницям усередині вікна
+                if part_first - last == 2:
+                    twins += 1
+                if part_first - last > max_gap:
+                    max_gap = part_first - last
+                    max_gap_start = last
+            if int(data["max_gap"]) > max_gap:
+                max_gap = int(data["max_gap"])
+                max_gap_start = int(data["max_gap_start"])
+            if first is None:
+                first = part_first
+            last = int(envelope["last"])
+        count += int(envelope["count"])
+        total += int(data["sum"])
+        twins += int(data["twins"])
+        for modulus, counts in data["residues"].items():
+            merged = residues.setdefault(modulus, {})
+            for residue, n in counts.items():
+                merged[residue] = merged.get(residue, 0) + int(n)
+    data = {"sum": total, "twins": twins, "max_gap": max_gap, "max_gap_start": max_gap_start,
+            "residues": residues}
+    return {
+        "encoding": STATS_ENCODING,
+        "start": start,
+        "end": end,
+        "count": count,
+        "first": first,
+        "last": last,
+        "data": data,
+        "backend": envelopes[0].get("backend") if envelopes else None,
+        "compute_ms": max([envelope.get("compute_ms", 0.0) for envelope in envelopes] or [0.0]),
+        "serialize_ms": sum(envelope.get("serialize_ms", 0.0) for envelope in envelopes),
+        "payload_bytes": sum(envelope.get("payload_bytes", 0) for envelope in envelopes),
+    }
+
+
+def merge_tree_results(method, results, start, end):
+    """Зливає результати method для сусідніх вікон (у порядку діапазону) в один."""
+    if method == "count_primes_in_range":
+        return sum(int(result) for result in results)
+    if isinstance(results[0], dict) and results[0]["encoding"] == STATS_ENCODING:
+        return merge_prime_stats(results, start, end)
+    if isinstance(results[0], dict):
+        return merge_prime_envelopes(results, start, end)
+    merged = []
+    for result in results:
+        merged.extend(result)
+    return merged
+
+
+class WorkerProfile(object):
+    """
+    Швидкості воркерів (одиниць вартості за мс), виміряні у попередніх запусках
+    за worker_times. Зберігається у JSON; воркер без історії отримує середню
+    швидкість відомих воркерів (або 1.0, якщо профіль порожній).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.speeds = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.speeds = dict((key, float(value)) for key, value in json.load(f).get("speeds", {}).items())
+            except (IOError, OSError, ValueError, AttributeError) as e:
+                print("WARNING: ignoring unreadable worker profile %s: %s" % (path, str(e)))
+
+    @staticmethod
+    def worker_key(worker, worker_idx):
+        """Ключ воркера у профілі: URI Pyro-проксі або порядковий номер."""
+        uri = getattr(worker, "_pyroUri", None)
+        return str(uri) if uri is not None else "worker-%d" % worker_idx
+
+    def get(self, keys):
+        """Швидкості для списку ключів воркерів."""
+        known = [self.speeds[key] for key in keys if key in self.speeds]
+        default = sum(known) / len(known) if known else 1.0
+        return [self.speeds.get(key, default) for key in keys]
+
+    def update(self, key, cost, elapsed_ms):
+        """Оновлює швидкість воркера за виконану вартість cost і виміряний час."""
+        if cost <= 0 or elapsed_ms <= 0:
+            return
+        speed = cost / elapsed_ms
+        if key in self.speeds:
+            speed = (1 - COST_PROFILE_SMOOTHING) * self.speeds[key] + COST_PROFILE_SMOOTHING * speed
+        self.speeds[key] = speed
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({"speeds": self.speeds}, f, indent=2, sort_keys=True)
+        except (IOError, OSError) as e:
+            print("WARNING: could not save worker profile %s: %s" % (self.path, str(e)))
+
+
+class TuningProfile(object):
+    """
+    Профіль вузлів для автотюнера: для кожного хоста і порядку end (кількість
+    цифр) - результат Solver.calibrate (пропускна здатність кожного бекенду
+    для кожного розміру сегмента, чисел/мс) і час round-trip виклику воркера.
+    Зберігається у JSON.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hosts = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    self.hosts = dict(json.load(f).get("hosts", {}))
+            except (IOError, OSError, ValueError, AttributeError) as e:
+                print("WARNING: ignoring unreadable tuning profile %s: %s" % (path, str(e)))
+
+    @staticmethod
+    def host_key(worker, worker_idx):
+        """Ключ вузла у профілі: хост з URI Pyro-проксі або порядковий номер воркера."""
+        uri = getattr(worker, "_pyroUri", None)
+        return str(uri.host) if uri is not None else "worker-%d" % worker_idx
+
+    @staticmethod
+    def bucket(end):
+        """Порядок end (кількість цифр): швидкість решета залежить від √end."""
+        return str(len(str(max(end, 1))))
+
+    def get(self, host, bucket):
+        return self.hosts.get(host, {}).get(bucket)
+
+    def set(self, host, bucket, entry):
+        self.hosts.setdefault(host, {})[bucket] = entry
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({"hosts": self.hosts}, f, indent=2, sort_keys=True)
+        except (IOError, OSError) as e:
+            print("WARNING: could not save tuning profile %s: %s" % (self.path, str(e)))
+
+
+def best_rate(entry, backend=None):
+    """(бекенд, розмір сегмента, чисел/мс) з найбільшою пропускною здатністю у записі калібрування."""
+    best = (None, None, 0.0)
+    for name, rates in entry["rates"].items():
+        if backend is not None and name != backend:
+            continue
+        for segment_size, rate in rates.items():
+            if rate > best[2]:
+                best = (name, int(segment_size), rate)
+    return best
+
+
+def host_rate(entry, backend, task_size, processes=None):
+    """
+    Прогнозована пропускна здатність хоста (чисел/мс) на задачах по task_size чисел.
+    Калібрування вимірює один процес, а вікна від LOCAL_POOL_MIN_RANGE
+    find_primes_in_range ділить між процесами локального пулу: cpu_count
+    хоста або processes (параметр local_processes), якщо він менший.
+    """
+    rate = best_rate(entry, backend)[2] or best_rate(entry)[2]
+    if task_size >= LOCAL_POOL_MIN_RANGE:
+        cpus = max(int(entry.get("cpu_count", 1)), 1)
+        rate *= min(cpus, int(processes)) if processes else cpus
+    return rate
+
+
+class PrimeChain(object):
+    """Впорядкована послідовність результатів воркерів (результат myreduce)."""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __iter__(self):
+        for part in self.parts:
+            for p in part.strings():
+                yield p
+
+
+def icbrt(n):
+    """Цілочисельний кубічний корінь: найбільше x, для якого x ** 3 <= n."""
+    x = int(round(n ** (1.0 / 3)))
+    while x ** 3 > n:
+        x -= 1
+    while (x + 1) ** 3 <= n:
+        x += 1
+    return x
+
+
+# Режими завдання (параметр mode у вхідному файлі)
+JOB_MODES = ("primes", "count", "test", "stats")
+
+# Тест простоти (mode=test, Solver.is_prime_batch, режим високого зміщення):
+# спершу пробне ділення на малі прості, потім свідки Міллера-Рабіна, відомі
+# як достатні для всіх n < 2^64, а для n < MR_DETERMINISTIC_LIMIT (≈ 3.3 * 10^24) -
+# перші 13 простих. Для більших n виконується тест BPSW (Міллер-Рабін за
+# основою 2 і сильний тест Люка): контрприкладів не відомо, але результат
+# означає "ймовірно просте".
+MR_SMALL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47,
+                   53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+MR_WITNESSES_64 = (2, 325, 9375, 28178, 450775, 9780504, 1795265022)
+MR_WITNESSES_LARGE = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+MR_DETERMINISTIC_LIMIT = 3317044064679887385961981
+UINT64 = struct.Struct("<Q")
+
+
+def jacobi(a, n):
+    """Символ Якобі (a / n) для непарного n > 0."""
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+
+def strong_lucas(n):
+    """
+    Сильний тест Люка на ймовірну простоту для непарного n > 2 без малих
+    дільників (параметри Селфріджа: перше D з 5, -7, 9, -11, ... з (D / n) = -1, P = 1).
+    """
+    root = isqrt(n)
+    if root * root == n:
+        return False
+    D = 5
+    while True:
+        j = jacobi(D, n)
+        if j == -1:
+            break
+        if j == 0 and abs(D) != n:
+            return False
+        D = -D - 2 if D > 0 else -D + 2
+    Q = (1 - D) // 4
+    d = n + 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    def half(x):
+        """x / 2 за модулем непарного n."""
+        return (x + n if x % 2 else x) // 2 % n
+
+    # U_k, V_k і Q^k за бітами d від старшого (k = 1 на старті)
+    U, V, Qk = 1, 1, Q % n
+    for bit in bin(d)[3:]:
+        U, V, Qk = U * V % n, (V * V - 2 * Qk) % n, Qk * Qk % n
+        if bit == "1":
+            U, V, Qk = half(U + V), half(D * U + V), Qk * Q % n
+    if U == 0 or V == 0:
+        return True
+    for _ in xrange(s - 1):
+        V, Qk = (V * V - 2 * Qk) % n, Qk * Qk % n
+        if V == 0:
+            return True
+    return False
+
+
+def miller_rabin(n):
+    """
+    Перевіряє простоту n: пробне ділення на малі прості + Міллер-Рабін,
+    детермінований для n < MR_DETERMINISTIC_LIMIT; для більших n - тест BPSW
+    (основа 2 + strong_lucas), результат якого означає "ймовірно просте".
+    """
+    if n < 2:
+        return False
+    for p in MR_SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n < MR_SMALL_PRIMES[-1] * MR_SMALL_PRIMES[-1]:
+        return True
+    d = n - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    if n < (1 << 64):
+        witnesses = MR_WITNESSES_64
+    elif n < MR_DETERMINISTIC_LIMIT:
+        witnesses = MR_WITNESSES_LARGE
+    else:
+        witnesses = (2,)
+    for a in witnesses:
+        a %= n
+        if a == 0:
+            continue
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in xrange(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return n < MR_DETERMINISTIC_LIMIT or strong_lucas(n)
+
+
+def pack_uint64(numbers):
+    """Пакує список цілих 0 <= n < 2^64 у байти (little-endian uint64)."""
+    return struct.pack("<%dQ" % len(numbers), *numbers)
+
+
+def unpack_uint64(data):
+    """Розпаковує байти pack_uint64 у список цілих."""
+    data = payload_bytes(data)
+    return list(struct.unpack("<%dQ" % (len(data) // UINT64.size), bytes(data)))
+
+
+def iter_bitmap(bitmap, count):
+    """Видає count прапорців (True/False) з бітової карти (молодший біт першим)."""
+    bitmap = payload_bytes(bitmap)
+    for i in xrange(count):
+        yield bool(bitmap[i >> 3] & (1 << (i & 7)))
+
+# Підрахунок π(x) методом Мейсселя-Лемера (mode=count):
+# - φ(y, k) для k <= PHI_TABLE_PRIMES обчислюється за таблицею періоду
+#   (добуток перших k простих), а не рекурсією;
+# - результати φ для y < PHI_MEMO_LIMIT кешуються;
+# - для x < COUNT_DIRECT_LIMIT простіше просіяти [1, x] і порахувати біти.
+PHI_TABLE_PRIMES = 6
+PHI_MEMO_LIMIT = 1 << 20
+COUNT_DIRECT_LIMIT = 10 ** 7
+
+
+class PrimeCounter(object):
+    """
+    Стан алгоритму Мейсселя-Лемера для одного x:
+        π(x) = φ(x, a) + a - 1 - P2(x, a),  a = π(∛x), b = π(√x),
+        φ(x, a) = φ(x, c) - Σ_{i=c+1..a} φ(x / p_i, i - 1),
+        P2(x, a) = Σ_{i=a+1..b} (π(x / p_i) - i + 1).
+    Доданки φ незалежні між собою, а значення π(x / p_i) < x^(2/3) беруться
+    з сегментованого решета, тому обидві фази розподіляються між воркерами.
+    """
+
+    _cached = None  # Останній лічильник на цьому вузлі (кеш φ між викликами)
+
+    def __init__(self, x):
+        self.x = x
+        self.limit = max(isqrt(x), 100)
+        self.primes = Solver.base_primes(self.limit)
+        self.a = bisect_right(self.primes, icbrt(x))
+        self.b = bisect_right(self.primes, isqrt(x))
+        self.tables = None
+        self.memo = {}
+
+    @classmethod
+    def get(cls, x):
+        """Повертає лічильник для x, повторно використовуючи кеш вузла."""
+        if cls._cached is None or cls._cached.x != x:
+            cls._cached = cls(x)
+        return cls._cached
+
+    def _build_tables(self):
+        """Таблиці φ(r, k) для r < Q_k, де Q_k - добуток перших k простих."""
+        self.tables = [(1, [0], 1)]
+        modulus = 1
+        for k in xrange(1, PHI_TABLE_PRIMES + 1):
+            modulus *= self.primes[k - 1]
+            coprime = bytearray(b"\x01") * modulus
+            for p in self.primes[:k]:
+                coprime[0::p] = bytearray((modulus - 1) // p + 1)
+            table = [0] + list(accumulate(coprime[1:]))
+            self.tables.append((modulus, table, table[-1]))
+
+    def phi(self, y, k):
+        """Кількість чисел 1..y, що не діляться на жодне з перших k простих."""
+        if k == 0:
+            return y
+        if k <= PHI_TABLE_PRIMES:
+            if self.tables is None:
+                self._build_tables()
+            modulus, table, totient = self.tables[k]
+            return (y // modulus) * totient + table[y % modulus]
+        primes = self.primes
+        if y <= primes[k - 1]:
+            return 1 if y >= 1 else 0
+        if y <= self.limit and k < len(primes) and primes[k] * primes[k] > y:
+            # Залишаються лише 1 та прості з (p_k, y]
+            return bisect_right(primes, y) - k + 1
+        memoize = y < PHI_MEMO_LIMIT
+        if memoize:
+            result = self.memo.get((y, k))
+            if result is not None:
+                return result
+        result = self.phi(y, PHI_TABLE_PRIMES)
+        for i in xrange(PHI_TABLE_PRIMES + 1, k + 1):
+            p = primes[i - 1]
+            if p * p > y:
+                # Для решти i маємо y / p_i < p_i, тобто φ(y / p_i, i - 1) = 1
+                result -= k - i + 1
+                break
+            result -= self.phi(y // p, i - 1)
+        if memoize:
+            self.memo[(y, k)] = result
+        return result
+
+    def phi_terms(self, i_start, i_step):
+        """Σ φ(x / p_i, i - 1) для i = i_start, i_start + i_step, ... <= a."""
+        return sum(self.phi(self.x // self.primes[i - 1], i - 1)
+                   for i in xrange(i_start, self.a + 1, i_step))
+
+    def p2_queries(self):
+        """Точки x / p_i для i = a+1..b у порядку зростання (разом з i)."""
+        return [(self.x // self.primes[i - 1], i) for i in xrange(self.b, self.a, -1)]
+
+    def p2_limit(self):
+        """Найбільша точка, в якій потрібне значення π для P2."""
+        return self.x // self.primes[self.a] if self.b > self.a else 1
+
+
+class _NullSpan(object):
+    """Спан, що нічого не записує: повертається вимкненим трасувальником."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    """Спан, що записує свою тривалість у Tracer при виході з блоку with."""
+
+    def __init__(self, tracer, name, category, worker, fields):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.worker = worker
+        self.fields = fields
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is not None:
+            self.fields["error"] = str(exc_value)
+        self.tracer.add(self.name, self.category, self.start, (time.time() - self.start) * 1000,
+                        self.worker, **self.fields)
+        return False
+
+    def set(self, **fields):
+        """Додає поля до спану (наприклад, кількість простих після виклику)."""
+        self.fields.update(fields)
+
+
+class Tracer(object):
+    """
+    Збирає спани фаз виконання: назва, категорія (master / worker), воркер,
+    початок і тривалість у мс від початку завдання, довільні поля.
+    Вимкнений трасувальник повертає NULL_SPAN і нічого не зберігає.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def span(self, name, category="master", worker=None, **fields):
+        """Контекстний менеджер, що вимірює блок with."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, category, worker, fields)
+
+    def add(self, name, category, start, duration_ms, worker=None, **fields):
+        """Записує спан з відомим початком (time.time()) і тривалістю."""
+        if not self.enabled:
+            return
+        span = {"name": name, "category": category, "worker": worker,
+                "start_ms": (start - self.origin) * 1000, "duration_ms": duration_ms}
+        span.update(fields)
+        with self.lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """Кількість і сумарна тривалість спанів кожної фази."""
+        phases = {}
+        for span in self.spans:
+            phase = phases.setdefault(span["name"], {"count": 0, "total_ms": 0.0})
+            phase["count"] += 1
+            phase["total_ms"] += span["duration_ms"]
+        return phases
+
+    def to_chrome(self):
+        """Події у форматі Chrome trace (ph = "X", час у мікросекундах)."""
+        events = []
+        threads = set()
+        for span in self.spans:
+            tid = 0 if span["worker"] is None else span["worker"] + 1
+            threads.add(tid)
+            args = dict((key, value) for key, value in span.items()
+                        if key not in ("name", "category", "worker", "start_ms", "duration_ms"))
+            events.append({"name": span["name"], "cat": span["category"], "ph": "X", "pid": 1, "tid": tid,
+                           "ts": span["start_ms"] * 1000, "dur": span["duration_ms"] * 1000, "args": args})
+        for tid in sorted(threads):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                           "args": {"name": "master" if tid == 0 else "worker %d" % (tid - 1)}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path, trace_format="json"):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError("Unknown trace format: %s" % trace_format)
+        with self.lock:
+            if trace_format == "chrome":
+                data = self.to_chrome()
+            else:
+                data = {"origin": self.origin, "spans": self.spans, "phases": self.summary()}
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=1)
+
+    def add_remote(self, worker, call_start, call_ms, result, **fields):
+        """
+        Розкладає виклик воркера на спани remote_compute, serialize і transfer
+        за часом, який повідомив воркер (compute_ms, serialize_ms). Годинники
+        вузлів не синхронізовані, тож передача вважається симетричною:
+        половина до обчислення, половина після серіалізації.
+        """
+        if not self.enabled:
+            return
+        compute_ms = result.compute_ms or 0.0
+        serialize_ms = result.serialize_ms or 0.0
+        half_transfer_ms = max(call_ms - compute_ms - serialize_ms, 0.0) / 2
+        compute_start = call_start + half_transfer_ms / 1000
+        self.add("transfer", "worker", call_start, half_transfer_ms, worker, direction="request", **fields)
+        self.add("remote_compute", "worker", compute_start, compute_ms, worker, backend=result.backend, **fields)
+        self.add("serialize", "worker", compute_start + compute_ms / 1000, serialize_ms, worker,
+                 encoding=result.encoding, payload_bytes=result.payload_bytes, **fields)
+        self.add("transfer", "worker", compute_start + (compute_ms + serialize_ms) / 1000, half_transfer_ms, worker,
+                 direction="response", **fields)
+
 
 def format_time(elapsed_ms):
     """
@@ -29,6 +2328,27 @@ def format_time(elapsed_ms):
         return "%d s %.3f ms (%.3f ms total)" % (seconds, milliseconds, elapsed_ms)
 
 
+def iter_primes(start, end=None, segment_size=SEGMENT_SIZE, backend_name=None):
+    """
+    Лінивий генератор простих чисел (int) з [start, end] у порядку зростання
+    для скриптів, що імпортують модуль напряму. Прості видаються сегмент за
+    сегментом тим самим ядром, що й у find_primes_in_range (Solver.iter_segments),
+    тож пам'ять - O(√end + segment_size) незалежно від ширини діапазону, а
+    вихід з циклу (break, itertools.islice, itertools.takewhile) зупиняє
+    просіювання. Без end генератор нескінченний: числа просіюються вікнами,
+    що подвоюються.
+    """
+    backend = get_sieve_backend(backend_name)
+    low = max(int(start), 2)
+    end = None if end is None else int(end)
+    while end is None or low <= end:
+        high = end if end is not None else low + max(low, segment_size) - 1
+        for segment_low, is_prime in Solver.iter_segments(low, high, segment_size, backend.name):
+            for p in backend.collect(is_prime, segment_low):
+                yield p
+        low = high + 1
+
+
 class Solver:
     def __init__(self, workers=None, input_file_name=None, output_file_name=None):
         self.input_file_name = input_file_name
@@ -37,6 +2357,14 @@ class Solver:
         self.execution_mode = None  # "SEQUENTIAL" або "PARALLEL"
         self.algorithm_used = None  # "Sieve of Eratosthenes" або "Prime Checking"
         self.num_workers_used = 0
+        self.options = {}  # Додаткові параметри з вхідного файлу (key=value)
+        self.test_numbers = []  # Кандидати для mode=test
+        self.ranges = None  # Діапазони завдання з кількома діапазонами (параметр range)
+        self.range_blocks = None  # (a, b, перший блок, останній блок) для кожного діапазону
+        self.fault_summary = None  # Статистика повторів і спекулятивних копій паралельного режиму
+        self.cache_summary = None  # Статистика дискового кешу блоків
+        self.tune_summary = None  # Рішення автотюнера
+        self.tracer = Tracer()  # Спани фаз; вмикається параметром trace
         print("Solver initialized")
 
     def solve(self):
@@ -47,34 +2375,78 @@ class Solver:
             print("Total workers available: %d" % workers_count)
             
             # Читаємо вхідні дані
+            read_start_time = time.time()
             start, end, max_workers = self.read_input()
-            print("Range: [%d, %d]" % (start, end))
+            self.tracer = Tracer(bool(self.options.get("trace")))
+            self.tracer.add("read_input", "master", read_start_time, (time.time() - read_start_time) * 1000)
+            mode = self.options.get("mode", "primes")
+            if mode not in JOB_MODES:
+                raise ValueError("Unknown job mode: %s" % mode)
+            if mode != "test":
+                print("Range: [%d, %d]" % (start, end))
         except Exception as e:
             print("ERROR in solve initialization: %s" % str(e))
             import traceback
             traceback.print_exc()
             raise
         
-        # Послідовний алгоритм: якщо немає воркерів або max_workers = 0
-        if not self.workers or workers_count == 0 or (max_workers is not None and max_workers == 0):
+        if mode == "count":
+            return self.solve_count(start, end, max_workers)
+        if mode == "stats":
+            return self.solve_stats(start, end, max_workers)
+        if mode == "test":
+            return self.solve_primality(max_workers)
+        
+        run_local = self.autotune(start, end, self.select_workers(max_workers))
+        
+        # Послідовний алгоритм: якщо немає воркерів, max_workers = 0 або
+        # автотюнер передбачає, що локально швидше, ніж з розсилкою задач
+        if not self.workers or workers_count == 0 or (max_workers is not None and max_workers == 0) or run_local:
             try:
                 self.execution_mode = "SEQUENTIAL"
                 self.num_workers_used = 0
                 print("=" * 60)
                 print("MODE: SEQUENTIAL ALGORITHM")
-                print("Reason: No workers available or max_workers = 0")
-                print("=" * 60)
-                # Визначаємо алгоритм на основі діапазону ПЕРЕД виконанням
-                SIEVE_LIMIT = 10000000
-                if end <= SIEVE_LIMIT:
-                    self.algorithm_used = "Sieve of Eratosthenes"
+                if run_local:
+                    print("Reason: auto-tuner predicts a local run is faster than dispatching to workers")
                 else:
-                    self.algorithm_used = "Prime Checking (trial division)"
+                    print("Reason: No workers available or max_workers = 0")
+                print("=" * 60)
+                # Сегментоване решето використовується для будь-якого розміру діапазону
+                backend = get_sieve_backend(self.options.get("backend"))
+                self.algorithm_used = "Segmented Sieve of Eratosthenes (backend: %s)" % backend.name
+                if sieve_prime_limit(end) < isqrt(max(end, 0)):
+                    self.algorithm_used += ", high-offset window: %s" % high_offset_label(end)
+                encoding = self.options.get("encoding", "text")
+                stream_chunk = int(self.options.get("stream_chunk", STREAM_CHUNK_SIZE))
+                all_primes = self.create_result_writer()
+                segment_cache = self.create_segment_cache()
                 start_time = time.time()
-                all_primes = self.find_primes_in_range(str(start), str(end))
+                # Діапазон обробляється блоками, які відразу дописуються у файл
+                for index, block_start, block_end in self.plan_blocks(start, end, stream_chunk):
+                    with self.tracer.span("cache_lookup", block=index) as span:
+                        cached = segment_cache.lookup(block_start, block_end) if segment_cache else None
+                        span.set(hit=cached is not None)
+                    if cached is not None:
+                        with self.tracer.span("reduce", block=index):
+                            all_primes.submit(index, cached_result(cached))
+                        continue
+                    call_start_time = time.time()
+                    result = PrimeResult(self.find_primes_in_range(str(block_start), str(block_end), backend.name, encoding,
+                                                                   self.options.get("local_processes"), None,
+                                                                   self.options.get("segment_size")))
+                    self.tracer.add_remote(None, call_start_time, (time.time() - call_start_time) * 1000, result, block=index)
+                    with self.tracer.span("reduce", block=index, primes=len(result)):
+                        all_primes.submit(index, result)
+                        if segment_cache:
+                            segment_cache.store(result)
                 end_time = time.time()
                 elapsed_ms = (end_time - start_time) * 1000
-                self.write_output(all_primes, elapsed_ms)
+                if segment_cache:
+                    self.cache_summary = segment_cache.summary()
+                with self.tracer.span("output"):
+                    self.write_output(all_primes, elapsed_ms)
+                all_primes.cleanup()
                 print("")
                 print("=" * 70)
                 print("PERFORMANCE SUMMARY")
@@ -84,10 +2456,13 @@ class Solver:
                 print("Execution mode: SEQUENTIAL")
                 print("Algorithm: %s" % self.algorithm_used)
                 print("Execution time: %s" % format_time(elapsed_ms))
+                if self.cache_summary:
+                    print("Segment cache: %s" % self.cache_summary)
                 print("=" * 70)
                 print("")
-                print("Computation finished. Found %d primes" % len(all_primes))
+                print("Computation finished. Found %d primes" % all_primes.count)
                 print("Sequential algorithm execution time: %s" % format_time(elapsed_ms))
+                self.write_trace()
                 print("Job Finished")
                 return
             except Exception as e:
@@ -108,136 +2483,50 @@ class Solver:
             print("MODE: PARALLEL ALGORITHM")
             if max_workers and max_workers > 0 and max_workers < len(self.workers):
                 workers_to_use = self.workers[:max_workers]
-                self.num_workers_used = len(workers_to_use)
-                print("Using %d workers (requested: %d, available: %d)" % (len(workers_to_use), max_workers, len(self.workers)))
-            else:
-                workers_to_use = self.workers
-                self.num_workers_used = len(workers_to_use)
-                print("Using all %d workers" % len(workers_to_use))
-            print("=" * 60)
-            
-            # Розділяємо діапазон між workers
-            total_range = end - start + 1
-            chunk_size = total_range // len(workers_to_use)
-            remainder = total_range % len(workers_to_use)
-            
-            # Визначаємо алгоритм на основі загального діапазону ПЕРЕД виконанням
-            SIEVE_LIMIT = 10000000
-            if end <= SIEVE_LIMIT:
-                self.algorithm_used = "Sieve of Eratosthenes"
-            else:
-                self.algorithm_used = "Prime Checking (trial division)"
-            
-            # Map фаза: розподіляємо завдання ПАРАЛЕЛЬНО
-            parallel_start_time = time.time()
-            mapped = [None] * len(workers_to_use)  # Попередньо виділяємо місце
-            worker_times = [0.0] * len(workers_to_use)  # Зберігаємо час виконання кожного воркера
-            worker_results = [None] * len(workers_to_use)
-            worker_primes_count = [0] * len(workers_to_use)
-            current_start = start
-            
-            # Структури для синхронізації потоків
-            threads = []
-            lock = threading.Lock()
-            
-            print("")
-            print("=" * 70)
-            print("PARALLEL EXECUTION - DETAILED TIMING")
-            print("=" * 70)
-            print("Starting %d workers in PARALLEL mode..." % len(workers_to_use))
-            print("")
-            
-            def worker_thread(worker_idx, chunk_start, chunk_end):
-                """Функція для виконання в окремому потоці"""
-                thread_start_time = time.time()
-                try:
-                    print(">>> Worker %d STARTED at %.3f: Processing range [%d, %d] (size: %d)" % 
-                          (worker_idx, thread_start_time, chunk_start, chunk_end, chunk_end - chunk_start + 1))
-                    
-                    # Час перед викликом воркера
-                    call_start_time = time.time()
-                    
-                    # Викликаємо воркера (це блокує потік до отримання результату)
-                    worker_result = workers_to_use[worker_idx].find_primes_in_range(str(chunk_start), str(chunk_end))
-                    
-                    # Час після отримання результату
-                    call_end_time = time.time()
-                    worker_elapsed_ms = (call_end_time - call_start_time) * 1000
-                    
-                    # Отримуємо реальне значення з FutureResult (якщо це Pyro4 async результат)
-                    if hasattr(worker_result, 'value'):
-                        actual_result = worker_result.value
-                    else:
-                        actual_result = worker_result
-                    
-                    # Зберігаємо результат
-                    with lock:
-                        worker_results[worker_idx] = actual_result
-                        worker_times[worker_idx] = worker_elapsed_ms
-                        worker_primes_count[worker_idx] = len(actual_result) if isinstance(actual_result, list) else 0
-                    
-                    thread_end_time = time.time()
-                    total_thread_time = (thread_end_time - thread_start_time) * 1000
-                    print("<<< Worker %d FINISHED at %.3f: Computation time %s, Total thread time %s (found %d primes)" % 
-                          (worker_idx, thread_end_time, format_time(worker_elapsed_ms), format_time(total_thread_time), worker_primes_count[worker_idx]))
-                except Exception as e:
-                    print("ERROR in worker %d: %s" % (worker_idx, str(e)))
-                    import traceback
-                    traceback.print_exc()
-                    with lock:
-                        worker_results[worker_idx] = []
-                        worker_times[worker_idx] = 0.0
-            
-            # Створюємо потоки для кожного воркера
-            print("Creating and starting %d worker threads..." % len(workers_to_use))
-            thread_creation_start = time.time()
-            for i in range(len(workers_to_use)):
-                # Розподіляємо залишок рівномірно між першими workers
-                current_chunk_size = chunk_size + (1 if i < remainder else 0)
-                chunk_start = current_start
-                chunk_end = current_start + current_chunk_size - 1
-                
-                # Переконуємося, що не виходимо за межі
-                if chunk_end > end:
-                    chunk_end = end
-                if chunk_start > end:
-                    # Якщо початок вже за межами, пропускаємо цей воркер
-                    break
-                
-                # Створюємо і запускаємо потік
-                thread = threading.Thread(target=worker_thread, args=(i, chunk_start, chunk_end))
-                thread.start()
-                threads.append(thread)
-                print("  Thread for Worker %d created and started" % i)
-                
-                current_start = chunk_end + 1
-                
-                # Якщо досягли кінця діапазону, зупиняємося
-                if chunk_end >= end:
-                    break
+                self.num_workers_used = len(workers_to_use)
+                print("Using %d workers (requested: %d, available: %d)" % (len(workers_to_use), max_workers, len(self.workers)))
+            else:
+                workers_to_use = self.workers
+                self.num_workers_used = len(workers_to_use)
+                print("Using all %d workers" % len(workers_to_use))
+            print("=" * 60)
+            # Дерево reduce: задачі надсилаються лише кореням, кожен повертає злитий результат піддерева
+            tree = self.reduce_tree_plan(workers_to_use)
+            if tree:
+                workers_to_use = [workers_to_use[i] for i, _, _ in tree]
             
-            thread_creation_end = time.time()
-            print("All %d threads started in %s" % (len(threads), format_time((thread_creation_end - thread_creation_start) * 1000)))
+            # Кожен воркер просіює лише своє вікно сегментованим решетом
+            # Бекенд визначається один раз на майстрі: воркери отримують ту саму назву, що й у заголовку
+            backend_name = get_sieve_backend(self.options.get("backend")).name
+            encoding = self.options.get("encoding", "text")
+            if encoding not in RESULT_ENCODINGS:
+                raise ValueError("Unknown result encoding: %s" % encoding)
+            self.algorithm_used = "Segmented Sieve of Eratosthenes (backend: %s)" % backend_name
+            if sieve_prime_limit(end) < isqrt(max(end, 0)):
+                self.algorithm_used += ", high-offset window: %s" % high_offset_label(end)
+            if tree:
+                self.algorithm_used += ", reduce tree with fan-in %d" % int(self.options.get("fan_in", DEFAULT_FAN_IN))
             
-            # Чекаємо завершення всіх потоків
-            print("")
-            print("Waiting for all workers to complete...")
-            join_start_time = time.time()
-            for i, thread in enumerate(threads):
-                thread.join()
-                join_end_time = time.time()
-                print("  Worker %d thread joined (waited %s)" % (i, format_time((join_end_time - join_start_time) * 1000)))
-                join_start_time = join_end_time
+            max_pending = int(self.options.get("max_pending", MAX_PENDING_CHUNKS))
+            scheduler, profile = self.create_scheduler(start, end, workers_to_use, tree)
+            args = (backend_name, encoding) + self.sieve_call_args(end)
+            all_primes = self.create_result_writer(max_pending)
+            segment_cache = self.create_segment_cache()
             
-            # Збираємо результати
-            for i in range(len(workers_to_use)):
-                mapped[i] = worker_results[i] if worker_results[i] is not None else []
+            # Map фаза: розподіляємо завдання ПАРАЛЕЛЬНО, reduce виконується потоково у all_primes
+            parallel_start_time = time.time()
+            worker_times, worker_primes_count, worker_details = self.map_blocks(
+                workers_to_use, tree, scheduler, args, all_primes.submit, segment_cache, profile)
+            if scheduler.error is not None:
+                all_primes.close()
+                all_primes.cleanup()
+                raise RuntimeError(scheduler.error)
+            if segment_cache:
+                self.cache_summary = segment_cache.summary()
             
-            # Reduce фаза: збираємо результати
-            reduce_start_time = time.time()
-            all_primes = self.myreduce(mapped)
-            reduce_end_time = time.time()
-            reduce_elapsed_ms = (reduce_end_time - reduce_start_time) * 1000
+            # Reduce фаза виконувалась потоково під час роботи воркерів
+            all_primes.close()
+            reduce_elapsed_ms = all_primes.write_ms
             
             parallel_end_time = time.time()
             parallel_elapsed_ms = (parallel_end_time - parallel_start_time) * 1000
@@ -260,12 +2549,27 @@ class Solver:
                 print("  Worker %d: %s (found %d primes)" % (i, format_time(wt), primes_found))
                 total_sequential_time += wt
             print("")
+            print("Per-worker timing breakdown (result encoding: %s):" % encoding)
+            for i, details in enumerate(worker_details):
+                if details:
+                    print("  Worker %d: compute %s | serialize %s | transfer+overhead %s | payload %d bytes" %
+                          (i, format_time(details["compute_ms"]), format_time(details["serialize_ms"]),
+                           format_time(details["transfer_ms"]), details["payload_bytes"]))
+            print("")
+            print("Load balance (scheduler: %s):" % self.options.get("scheduler", "static"))
+            for i, details in enumerate(worker_details):
+                print("  Worker %d: %d tasks, idle %s" % (i, details["tasks"], format_time(details["idle_ms"])))
+            print("")
             print("Timing breakdown:")
             print("  Longest worker time: %s" % format_time(max(worker_times)))
             print("  Average worker time: %s" % format_time(sum(worker_times) / len(worker_times)))
             print("  Total sequential time (if run one by one): %s" % format_time(total_sequential_time))
-            print("  Reduce phase time: %s" % format_time(reduce_elapsed_ms))
+            print("  Reduce phase time (streaming, ordered writes): %s" % format_time(reduce_elapsed_ms))
+            print("  Reduce buffering: max %d blocks in memory (limit %d), %d blocks spilled to disk" %
+                  (all_primes.max_buffered, all_primes.max_pending, all_primes.spill_count))
             print("  Total parallel execution time: %s" % format_time(parallel_elapsed_ms))
+            if self.cache_summary:
+                print("  Segment cache: %s" % self.cache_summary)
             print("")
             if len(worker_times) > 1:
                 speedup = total_sequential_time / max(worker_times) if max(worker_times) > 0 else 1.0
@@ -298,11 +2602,14 @@ class Solver:
             print("=" * 70)
             
             # Записуємо результат (all_primes вже список рядків)
-            self.write_output(all_primes, parallel_elapsed_ms, worker_times)
+            with self.tracer.span("output"):
+                self.write_output(all_primes, parallel_elapsed_ms, worker_times, worker_details)
+            all_primes.cleanup()
             
             print("")
-            print("Computation finished. Found %d primes" % len(all_primes))
+            print("Computation finished. Found %d primes" % all_primes.count)
             print("Total execution time: %s" % format_time(parallel_elapsed_ms))
+            self.write_trace()
             print("Job Finished")
         except Exception as e:
             print("ERROR in parallel algorithm: %s" % str(e))
@@ -315,104 +2622,1081 @@ class Solver:
                 self.algorithm_used = "UNKNOWN (error occurred)"
             raise
 
+    def create_scheduler(self, start, end, workers_to_use, tree):
+        """
+        Планує блоки паралельного запуску (mode=primes і mode=stats) і створює
+        TaskScheduler за параметром scheduler. Повертає (планувальник, профіль
+        швидкостей WorkerProfile або None, якщо планувальник не costmodel).
+        """
+        scheduler_name = self.options.get("scheduler", "static")
+        if scheduler_name not in SCHEDULERS:
+            raise ValueError("Unknown scheduler: %s" % scheduler_name)
+        # static: чанк кожного воркера ділиться на блоки не більше stream_chunk чисел;
+        # dynamic: весь діапазон ділиться на задачі по grain чисел у спільній черзі.
+        # Задачі нумеруються у порядку діапазону і записуються потоково.
+        stream_chunk = int(self.options.get("stream_chunk", STREAM_CHUNK_SIZE))
+        # Профіль швидкостей потрібен лише costmodel, тож інші планувальники його не читають і не змінюють.
+        # Корінь дерева reduce просіює силами всього піддерева: його вага - розмір піддерева
+        # (помножений на швидкість вузла з профілю), а у профіль записується швидкість одного вузла
+        sizes = [size for _, _, size in tree] if tree else [1] * len(workers_to_use)
+        profile = None
+        if scheduler_name == "costmodel":
+            profile = WorkerProfile(self.cost_profile_path())
+            worker_keys = [WorkerProfile.worker_key(w, i) for i, w in enumerate(workers_to_use)]
+            speeds = [speed * size for speed, size in zip(profile.get(worker_keys), sizes)]
+        else:
+            speeds = sizes
+        max_attempts = int(self.options.get("retries", MAX_TASK_ATTEMPTS))
+        speculate = float(self.options.get("speculate", SPECULATIVE_FACTOR))
+        timeout = self.call_timeout()
+        for worker in workers_to_use:
+            if timeout and hasattr(worker, "_pyroTimeout"):
+                worker._pyroTimeout = timeout
+        print("Fault tolerance: %d attempts per block, speculative copies after %.1fx median, call timeout %s" %
+              (max_attempts, speculate, "%s s" % timeout if timeout else "none"))
+        if scheduler_name == "dynamic":
+            grain = int(self.options.get("grain", DEFAULT_GRAIN))
+            tasks = self.plan_blocks(start, end, grain)
+            print("Scheduler: dynamic (%d tasks of up to %d numbers in a shared queue)" % (len(tasks), grain))
+            return TaskScheduler(len(workers_to_use), tasks=tasks, max_attempts=max_attempts, speculate=speculate), profile
+        if self.ranges:
+            # Кілька діапазонів: блоки об'єднання діляться на послідовні групи за вартістю
+            assignment = partition_tasks(self.plan_blocks(start, end, stream_chunk), speeds)
+            print("Scheduler: %s (%d blocks of %d ranges in contiguous groups per worker)" %
+                  (scheduler_name, sum(len(a) for a in assignment), len(self.ranges)))
+        else:
+            if scheduler_name == "costmodel":
+                chunks = cost_partition(start, end, speeds)
+                print("Scheduler: costmodel (chunks sized by predicted cost and calibrated worker speed)")
+                for i, (chunk_start, chunk_end) in enumerate(chunks):
+                    print("  Worker %d: [%d, %d], speed %.3f, predicted time %s" %
+                          (i, chunk_start, chunk_end, speeds[i],
+                           format_time(range_cost(chunk_start, chunk_end) / speeds[i])))
+            elif tree:
+                chunks = cost_partition(start, end, speeds)
+                print("Scheduler: static (one contiguous chunk per reduce tree, sized by tree size)")
+            else:
+                chunks = split_range(start, end, len(workers_to_use))
+                chunks += [(end + 1, end)] * (len(workers_to_use) - len(chunks))
+                print("Scheduler: static (one contiguous chunk per worker)")
+            assignment = []
+            for chunk_start, chunk_end in chunks:
+                assignment.append(split_blocks(chunk_start, chunk_end, stream_chunk, sum(len(a) for a in assignment)))
+        return TaskScheduler(len(workers_to_use), assignment=assignment,
+                             max_attempts=max_attempts, speculate=speculate), profile
+
+    def sieve_call_args(self, end):
+        """
+        Параметри find_primes_in_range після бекенду і кодування, спільні для
+        всіх блоків: (local_processes, таблиця базових простих або None, segment_size).
+        """
+        local_processes = self.options.get("local_processes")
+        if local_processes is not None:
+            local_processes = int(local_processes)
+        segment_size = self.options.get("segment_size")
+        if segment_size is not None:
+            segment_size = int(segment_size)
+        # Таблицю базових простих до √end майстер може обчислити один раз і передавати з кожною задачею
+        base_table = None
+        if self.options.get("push_base_primes", "0").lower() in ("1", "true", "yes"):
+            base_table = BASE_PRIMES.export(sieve_prime_limit(end))
+            print("Base primes: pushing table up to %d with each task (%d bytes)" % (sieve_prime_limit(end), len(base_table)))
+        return local_processes, base_table, segment_size
+
+    def map_blocks(self, workers_to_use, tree, scheduler, args, submit, segment_cache=None, profile=None):
+        """
+        Map-фаза паралельного запуску: виконує блоки scheduler викликами
+        find_primes_in_range(block_start, block_end, *args) (з деревом reduce -
+        через reduce_tree коренів), повторює невдалі блоки і передає перший
+        результат кожного блоку (PrimeResult) у submit(index, result) - потоковий
+        reduce режиму. Оновлює профіль швидкостей costmodel, якщо він заданий.
+        Повертає (час зайнятості кожного воркера у мс, знайдено простих кожним
+        воркером, розбивка часу кожного воркера); помилку залишає у scheduler.error.
+        """
+        backend_name = args[0]
+        parallel_start_time = time.time()
+        worker_times = [0.0] * len(workers_to_use)  # Зберігаємо час виконання кожного воркера
+        worker_primes_count = [0] * len(workers_to_use)
+        worker_details = [None] * len(workers_to_use)  # Розбивка часу: обчислення / серіалізація / передача
+        worker_costs = [0.0] * len(workers_to_use)  # Прогнозована вартість виконаних задач
+        worker_backends = set()  # Бекенди, якими фактично просіювали воркери (з конвертів)
+        
+        # Конвеєрна диспетчеризація: кожен воркер одночасно має до inflight задач,
+        # тож запит наступного блоку перекривається з передачею поточного.
+        # Завершення обробляються у порядку надходження з черги подій.
+        inflight = max(int(self.options.get("inflight", PIPELINE_DEPTH)), 1)
+        completions = queue.Queue()
+        channels = [AsyncChannel(worker, completions, inflight) for worker in workers_to_use]
+        in_flight = [0] * len(workers_to_use)
+        busy_since = [0.0] * len(workers_to_use)
+        
+        print("")
+        print("=" * 70)
+        print("PARALLEL EXECUTION - DETAILED TIMING")
+        print("=" * 70)
+        print("Dispatching to %d workers (%s calls, up to %d tasks in flight per worker)..." %
+              (len(workers_to_use), channels[0].kind, inflight))
+        print("")
+        
+        def dispatch(worker_idx):
+            """Доповнює конвеєр воркера задачами планувальника."""
+            while in_flight[worker_idx] < inflight:
+                task = scheduler.next_task(worker_idx, wait=False)
+                if task is None:
+                    return
+                index, block_start, block_end = task
+                # Блок, уже обчислений у попередніх запусках, береться з дискового кешу
+                with self.tracer.span("cache_lookup", "master", worker_idx, block=index) as span:
+                    cached = segment_cache.lookup(block_start, block_end) if segment_cache else None
+                    span.set(hit=cached is not None)
+                if cached is not None:
+                    if scheduler.commit_cached(worker_idx, task):
+                        with self.tracer.span("reduce", "master", worker_idx, block=index):
+                            submit(index, cached_result(cached))
+                        scheduler.commit(task)
+                    continue
+                if in_flight[worker_idx] == 0:
+                    busy_since[worker_idx] = time.time()
+                in_flight[worker_idx] += 1
+                call_args = (str(block_start), str(block_end)) + args
+                if tree:
+                    channels[worker_idx].call((worker_idx, task, time.time()), "reduce_tree",
+                                              "find_primes_in_range", tree[worker_idx][1], *call_args)
+                else:
+                    channels[worker_idx].call((worker_idx, task, time.time()), "find_primes_in_range", *call_args)
+        
+        def complete(worker_idx, task, call_start_time, worker_result, error):
+            """Обробляє завершений виклик: статистика, повтор або потоковий reduce."""
+            index, block_start, block_end = task
+            call_end_time = time.time()
+            worker_elapsed_ms = (call_end_time - call_start_time) * 1000
+            # Час зайнятості - об'єднання інтервалів, коли у воркера є задачі в польоті
+            in_flight[worker_idx] -= 1
+            busy_ms = 0.0
+            if in_flight[worker_idx] == 0:
+                busy_ms = (call_end_time - busy_since[worker_idx]) * 1000
+                worker_times[worker_idx] += busy_ms
+            if error is None:
+                try:
+                    if isinstance(worker_result, dict):
+                        actual_result = PrimeResult(worker_result)
+                    else:
+                        actual_result = PrimeResult.from_list(worker_result, block_start, block_end)
+                except Exception as e:
+                    error = e
+            if error is not None:
+                # Блок буде повторено на іншому воркері
+                print("ERROR in worker %d (block [%d, %d]): %s" % (worker_idx, block_start, block_end, str(error)))
+                self.tracer.add("dispatch", "master", call_start_time, worker_elapsed_ms,
+                                worker_idx, block=index, error=str(error))
+                scheduler.task_failed(worker_idx, task, busy_ms)
+                return
+            first = scheduler.task_done(worker_idx, task, worker_elapsed_ms, busy_ms)
+            self.tracer.add("dispatch", "master", call_start_time, worker_elapsed_ms, worker_idx,
+                            block=index, range_start=block_start, range_end=block_end,
+                            primes=len(actual_result), won=first)
+            self.tracer.add_remote(worker_idx, call_start_time, worker_elapsed_ms, actual_result, block=index)
+            
+            details = worker_details[worker_idx]
+            if details is None:
+                details = worker_details[worker_idx] = {"compute_ms": 0.0, "serialize_ms": 0.0,
+                                                        "payload_bytes": 0, "transfer_ms": 0.0}
+            details["compute_ms"] += actual_result.compute_ms
+            details["serialize_ms"] += actual_result.serialize_ms
+            details["payload_bytes"] += actual_result.payload_bytes
+            details["transfer_ms"] += max(worker_elapsed_ms - actual_result.compute_ms - actual_result.serialize_ms, 0.0)
+            if not first:
+                print("Worker %d: block [%d, %d] already completed by another worker, result discarded" %
+                      (worker_idx, block_start, block_end))
+                return
+            # Вартість рахується лише для записаних результатів: відкинуті копії не входять у профіль
+            worker_costs[worker_idx] += range_cost(block_start, block_end)
+            worker_primes_count[worker_idx] += len(actual_result)
+            if actual_result.backend:
+                worker_backends.add(actual_result.backend)
+            with self.tracer.span("reduce", "master", worker_idx, block=index):
+                submit(index, actual_result)
+                if segment_cache:
+                    segment_cache.store(actual_result)
+            scheduler.commit(task)
+        
+        # Цикл подій: обробляємо завершення в порядку надходження і доповнюємо
+        # конвеєри (зокрема повторами та спекулятивними копіями відсталих блоків)
+        for i in xrange(len(workers_to_use)):
+            dispatch(i)
+        while not scheduler.finished():
+            try:
+                tag, value, error = completions.get(timeout=SCHEDULER_POLL)
+            except queue.Empty:
+                tag = None
+            if tag is not None:
+                complete(tag[0], tag[1], tag[2], value, error)
+            for i in xrange(len(workers_to_use)):
+                dispatch(i)
+        
+        for i in xrange(len(workers_to_use)):
+            channels[i].close()
+            if in_flight[i]:
+                print("  Worker %d still has %d superseded calls in flight, not waiting for them" % (i, in_flight[i]))
+            print("<<< Worker %d FINISHED: busy time %s (%d tasks, found %d primes)" %
+                  (i, format_time(worker_times[i]), scheduler.task_counts[i], worker_primes_count[i]))
+        map_elapsed_ms = (time.time() - parallel_start_time) * 1000
+        print("Fault tolerance: %s" % scheduler.summary())
+        self.tracer.add("map", "master", parallel_start_time, map_elapsed_ms)
+        if scheduler.error is not None:
+            return worker_times, worker_primes_count, worker_details
+        self.fault_summary = scheduler.summary()
+        if worker_backends - set([backend_name]):
+            # Воркер без NumPy переходить на bytearray-бекенд сам
+            print("WARNING: workers sieved with %s instead of %s" % (", ".join(sorted(worker_backends)), backend_name))
+            self.algorithm_used = self.algorithm_used.replace(
+                "(backend: %s)" % backend_name, "(backend: %s)" % ", ".join(sorted(worker_backends)), 1)
+        for i in xrange(len(workers_to_use)):
+            if worker_details[i] is None:
+                worker_details[i] = {"compute_ms": 0.0, "serialize_ms": 0.0, "payload_bytes": 0, "transfer_ms": 0.0}
+            worker_details[i]["tasks"] = scheduler.task_counts[i]
+            worker_details[i]["idle_ms"] = scheduler.idle_ms(i, map_elapsed_ms)
+        if profile is not None:
+            sizes = [size for _, _, size in tree] if tree else [1] * len(workers_to_use)
+            for i, worker in enumerate(workers_to_use):
+                profile.update(WorkerProfile.worker_key(worker, i), worker_costs[i] / sizes[i], worker_times[i])
+            profile.save()
+        return worker_times, worker_primes_count, worker_details
+
+    def select_workers(self, max_workers):
+        """Повертає список воркерів з урахуванням max_workers (порожній - послідовний режим)."""
+        if not self.workers:
+            return []
+        if max_workers is not None and max_workers == 0:
+            return []
+        if max_workers and max_workers < len(self.workers):
+            return self.workers[:max_workers]
+        return self.workers
+
+    def reduce_tree_plan(self, workers):
+        """
+        Корені дерева reduce над workers (параметр fan_in): список (індекс
+        воркера, діти у форматі reduce_tree, розмір піддерева) або None, якщо
+        воркерів не більше за fan_in і результати зливає лише майстер.
+        Вузлам передаються URI дочірніх воркерів, тож дерево будується лише над Pyro4-проксі.
+        """
+        fan_in = int(self.options.get("fan_in", DEFAULT_FAN_IN))
+        if fan_in < 2 or len(workers) <= fan_in:
+            return None
+        if not all(hasattr(worker, "_pyroUri") for worker in workers):
+            print("Reduce tree: workers are not Pyro4 proxies, using flat reduce")
+            return None
+
+        def spec(children):
+            return [[str(workers[i]._pyroUri), spec(grandchildren)] for i, grandchildren in children]
+        plan = []
+        for i, children in build_reduce_tree(len(workers), fan_in):
+            children = spec(children)
+            plan.append((i, children, tree_size(children)))
+        print("Reduce tree: %d workers, fan-in %d, %d roots, depth %d" %
+              (len(workers), fan_in, len(plan), max(tree_depth(children) for _, children, _ in plan)))
+        return plan
+
+    def run_tasks(self, workers, calls, pinned=False):
+        """
+        Виконує виклики calls = [(назва методу, аргументи), ...] на воркерах:
+        воркер j спершу отримує виклики j, j + W, j + 2W, ... і виконує їх у
+        своєму потоці. Як і блоки решета, виклики розподіляє TaskScheduler:
+        невдалий виклик повторюється на іншому воркері (параметр retries),
+        воркер після кількох невдач поспіль виводиться з роботи, а для
+        відсталого виклику запускається спекулятивна копія. З pinned=True
+        виклик вимірює саме свій вузол (калібрування), тож не повторюється і
+        не копіюється на інших воркерах. Без воркерів виклики виконуються локально. Виклик, що вичерпав спроби,
+        перериває завдання своєю помилкою, щоб не повернути неповний результат.
+        Повертає (результати у порядку calls, сумарний час кожного воркера у мс).
+        """
+        results = [None] * len(calls)
+        if not workers:
+            start_time = time.time()
+            for k, (method, args) in enumerate(calls):
+                with self.tracer.span("compute", method=method, call=k):
+                    results[k] = getattr(Solver, method)(*args)
+            return results, [(time.time() - start_time) * 1000]
+        
+        worker_times = [0.0] * len(workers)
+        errors = {}
+        # Задача (k, k, k): швидкість для пошуку відсталих викликів рахується на один виклик
+        assignment = [[(k, k, k) for k in xrange(j, len(calls), len(workers))] for j in xrange(len(workers))]
+        if pinned:
+            scheduler = TaskScheduler(len(workers), assignment=assignment, max_attempts=1, speculate=0)
+        else:
+            scheduler = TaskScheduler(len(workers), assignment=assignment,
+                                      max_attempts=int(self.options.get("retries", MAX_TASK_ATTEMPTS)),
+                                      speculate=float(self.options.get("speculate", SPECULATIVE_FACTOR)))
+        
+        def worker_thread(worker_idx):
+            while True:
+                task = scheduler.next_task(worker_idx)
+                if task is None:
+                    return
+                k = task[0]
+                method, args = calls[k]
+                call_start_time = time.time()
+                try:
+                    result = getattr(workers[worker_idx], method)(*args)
+                    if hasattr(result, 'value'):
+                        result = result.value
+                except Exception as e:
+                    elapsed_ms = (time.time() - call_start_time) * 1000
+                    print("ERROR in worker %d (%s): %s" % (worker_idx, method, str(e)))
+                    errors[k] = e
+                    worker_times[worker_idx] += elapsed_ms
+                    scheduler.task_failed(worker_idx, task, elapsed_ms)
+                    continue
+                elapsed_ms = (time.time() - call_start_time) * 1000
+                worker_times[worker_idx] += elapsed_ms
+                self.tracer.add("dispatch", "master", call_start_time, elapsed_ms, worker_idx, method=method, call=k)
+                if scheduler.task_done(worker_idx, task, elapsed_ms):
+                    results[k] = result
+                    scheduler.commit(task)
+        
+        threads = [threading.Thread(target=worker_thread, args=(i,)) for i in xrange(len(workers))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        # Виклики, які вже виконала спекулятивна копія, не очікуються
+        with scheduler.cond:
+            while not scheduler.finished():
+                scheduler.cond.wait(SCHEDULER_POLL)
+        if scheduler.failures or scheduler.speculative:
+            self.fault_summary = scheduler.summary()
+            print("Fault tolerance: %s" % self.fault_summary)
+        if scheduler.error is not None:
+            print("ERROR: %s" % scheduler.error)
+            failed = [k for k in sorted(errors) if k in scheduler.remaining]
+            raise errors[failed[0]] if failed else RuntimeError(scheduler.error)
+        return results, list(worker_times)
+
+    def count_primes_upto(self, x, workers):
+        """
+        Обчислює π(x). Для малих x - просіюванням, інакше методом Мейсселя-Лемера:
+        доданки φ(x / p_i, i - 1) та сегменти решета для P2 виконуються на воркерах.
+        Повертає (π(x), час кожного воркера у мс).
+        """
+        if x < COUNT_DIRECT_LIMIT:
+            return Solver.count_primes_in_range(str(2), str(x), self.options.get("backend")), []
+        counter = PrimeCounter.get(x)
+        if counter.a <= PHI_TABLE_PRIMES:
+            return Solver.count_primes_in_range(str(2), str(x), self.options.get("backend")), []
+        
+        tasks = max(len(workers), 1)
+        calls = []
+        # φ: доданки розподіляються через крок, щоб дорогі (малі i) потрапили до всіх воркерів
+        for j in xrange(tasks):
+            calls.append(("prime_count_phi", (str(x), PHI_TABLE_PRIMES + 1 + j, tasks)))
+        # P2: сегменти [lo, hi] решета до x / p_(a+1)
+        p2_limit = counter.p2_limit()
+        segments = tasks * 4
+        segment_length = max(p2_limit // segments + 1, SEGMENT_SIZE)
+        bounds = [(lo, min(lo + segment_length - 1, p2_limit)) for lo in xrange(1, p2_limit + 1, segment_length)]
+        for lo, hi in bounds:
+            calls.append(("prime_count_segment", (str(x), str(lo), str(hi), self.options.get("backend"))))
+        
+        print("Meissel-Lehmer for x = %d: a = %d, b = %d, %d phi tasks, %d P2 segments up to %d" %
+              (x, counter.a, counter.b, tasks, len(bounds), p2_limit))
+        results, worker_times = self.run_tasks(workers, calls)
+        
+        phi = counter.phi(x, PHI_TABLE_PRIMES) - sum(int(r) for r in results[:tasks])
+        # P2: префіксні суми кількостей по сегментах дають π(x / p_i)
+        queries = counter.p2_queries()
+        p2 = 0
+        prefix = 0
+        q = 0
+        for (lo, hi), (segment_count, local_counts) in zip(bounds, results[tasks:]):
+            for local in local_counts:
+                p2 += prefix + int(local) - (queries[q][1] - 1)
+                q += 1
+            prefix += int(segment_count)
+        if q != len(queries):
+            raise ValueError("P2 phase returned %d of %d values" % (q, len(queries)))
+        return phi + counter.a - 1 - p2, worker_times
+
+    def count_range(self, start, end, workers_to_use):
+        """
+        Кількість простих у [start, end] як π(end) - π(start - 1).
+        Вузьке вікно (ширина не більша за end^(2/3)) просіюється воркерами
+        з поверненням лише кількостей. Повертає (кількість, час кожного воркера у мс).
+        """
+        low = max(start, 2)
+        worker_times = []
+        if end < low:
+            self.algorithm_used = "Prime counting (empty range)"
+            count = 0
+        elif end < COUNT_DIRECT_LIMIT or end - low + 1 <= icbrt(end) ** 2:
+            self.algorithm_used = "Segmented Sieve of Eratosthenes (count only)"
+            tree = self.reduce_tree_plan(workers_to_use)
+            if tree:
+                # Кожен корінь повертає лише суму кількостей свого піддерева
+                chunks = cost_partition(low, end, [size for _, _, size in tree])
+                calls = [("reduce_tree", ("count_primes_in_range", children, str(lo), str(hi), self.options.get("backend")))
+                         for (_, children, _), (lo, hi) in zip(tree, chunks)]
+                results, worker_times = self.run_tasks([workers_to_use[i] for i, _, _ in tree], calls)
+            else:
+                tasks = max(len(workers_to_use), 1)
+                length = (end - low + 1) // tasks + 1
+                calls = [("count_primes_in_range", (str(lo), str(min(lo + length - 1, end)), self.options.get("backend")))
+                         for lo in xrange(low, end + 1, length)]
+                results, worker_times = self.run_tasks(workers_to_use, calls)
+            count = sum(int(r) for r in results)
+        else:
+            self.algorithm_used = "Meissel-Lehmer prime counting (distributed phi and P2)"
+            count_end, times_end = self.count_primes_upto(end, workers_to_use)
+            count_start, times_start = self.count_primes_upto(low - 1, workers_to_use)
+            count = count_end - count_start
+            worker_times = [a + b for a, b in zip(times_end, times_start)] if times_start else times_end
+        return count, worker_times
+
+    def count_ranges(self, ranges, workers_to_use):
+        """
+        Кількості простих для кожного з ranges (завдання з кількома діапазонами).
+        Вузькі діапазони рахуються разом: відрізки їхнього об'єднання
+        (range_pieces) просіюються одним пакетом викликів, і кількість діапазону -
+        сума його відрізків; широкі рахуються по одному (count_range).
+        Повертає (кількості, сумарний час кожного воркера у мс).
+        """
+        counts = [None] * len(ranges)
+        worker_times = []
+        narrow = [(max(a, 2), b) for a, b in ranges
+                  if b >= max(a, 2) and (b < COUNT_DIRECT_LIMIT or b - max(a, 2) + 1 <= icbrt(b) ** 2)]
+        if narrow:
+            pieces = range_pieces(narrow)
+            calls = [("count_primes_in_range", (str(lo), str(hi), self.options.get("backend"))) for lo, hi in pieces]
+            results, worker_times = self.run_tasks(workers_to_use, calls)
+            prefix = [0] + list(accumulate(int(r) for r in results))
+            piece_starts = [lo for lo, _ in pieces]
+            narrow_set = set(narrow)
+            for k, (a, b) in enumerate(ranges):
+                low = max(a, 2)
+                if b < low:
+                    counts[k] = 0
+                elif (low, b) in narrow_set:
+                    counts[k] = prefix[bisect_right(piece_starts, b)] - prefix[bisect_left(piece_starts, low)]
+        for k, (a, b) in enumerate(ranges):
+            if counts[k] is None:
+                counts[k], times = self.count_range(a, b, workers_to_use)
+                if times:
+                    worker_times = [x + y for x, y in zip(worker_times, times)] if worker_times else times
+        self.algorithm_used = ("Segmented Sieve of Eratosthenes (count only, %d ranges batched)" % len(narrow)
+                               if len(narrow) == len(ranges) else
+                               "Segmented sieve (%d ranges batched) and Meissel-Lehmer prime counting" % len(narrow))
+        return counts, worker_times
+
+    def solve_count(self, start, end, max_workers):
+        """
+        Режим mode=count: обчислює лише кількість простих у [start, end]
+        (або в кожному діапазоні завдання з кількома діапазонами),
+        не передаючи самі прості числа.
+        """
+        workers_to_use = self.select_workers(max_workers)
+        self.execution_mode = "PARALLEL" if workers_to_use else "SEQUENTIAL"
+        self.num_workers_used = len(workers_to_use)
+        print("=" * 60)
+        print("MODE: PRIME COUNTING (%s, %d workers)" % (self.execution_mode, self.num_workers_used))
+        print("=" * 60)
+        start_time = time.time()
+        if self.ranges:
+            # Total primes found, як і в mode=primes, - кількість різних простих в
+            # об'єднанні; для діапазонів, що перетинаються, рахуються ще й відрізки
+            # об'єднання (їхні межі - межі діапазонів, тож нових відрізків решета немає)
+            union = []
+            for lo, hi in range_pieces(self.ranges):
+                if union and union[-1][1] + 1 == lo:
+                    union[-1] = (union[-1][0], hi)
+                else:
+                    union.append((lo, hi))
+            if sum(hi - lo + 1 for lo, hi in union) < sum(b - a + 1 for a, b in self.ranges if a <= b):
+                counts, worker_times = self.count_ranges(self.ranges + union, workers_to_use)
+                count = sum(counts[len(self.ranges):])
+                counts = counts[:len(self.ranges)]
+            else:
+                counts, worker_times = self.count_ranges(self.ranges, workers_to_use)
+                count = sum(counts)
+        else:
+            count, worker_times = self.count_range(start, end, workers_to_use)
+        elapsed_ms = (time.time() - start_time) * 1000
+        
+        f = open(self.output_file_name, 'w')
+        self.write_header(f, elapsed_ms, worker_times if self.execution_mode == "PARALLEL" else None)
+        if self.ranges:
+            f.write("PRIME COUNTS BY RANGE:\n")
+            f.write("-" * 70 + "\n")
+            for (a, b), range_count in zip(self.ranges, counts):
+                f.write("Range [%d, %d]: %d\n" % (a, b, range_count))
+            f.write("-" * 70 + "\n")
+            f.write("Ranges: %d\n" % len(self.ranges))
+            f.write("Sum over ranges: %d\n" % sum(counts))
+            f.write("Total primes found: %d (distinct primes in the union of ranges)\n" % count)
+        else:
+            f.write("PRIME COUNT:\n")
+            f.write("-" * 70 + "\n")
+            f.write("Range: [%d, %d]\n" % (start, end))
+            f.write("Total primes found: %d\n" % count)
+        f.write("=" * 70 + "\n")
+        f.close()
+        print("output done - file written to: %s" % self.output_file_name)
+        
+        print("")
+        print("=" * 70)
+        print("PERFORMANCE SUMMARY - PRIME COUNTING")
+        print("=" * 70)
+        print("Range: [%d, %d]" % (start, end))
+        print("Algorithm: %s" % self.algorithm_used)
+        for i, wt in enumerate(worker_times if self.execution_mode == "PARALLEL" else []):
+            print("  Worker %d: %s" % (i, format_time(wt)))
+        print("Execution time: %s" % format_time(elapsed_ms))
+        print("=" * 70)
+        print("")
+        print("Computation finished. Found %d primes" % count)
+        self.write_trace()
+        print("Job Finished")
+
+    def solve_stats(self, start, end, max_workers):
+        """
+        Режим mode=stats: статистика простих у [start, end] (або в кожному
+        діапазоні завдання з кількома діапазонами) без передачі самих простих.
+        Блоки плануються і виконуються тим самим циклом map_blocks, що й у
+        mode=primes (планувальник, повтори, спекулятивні копії, дерево reduce),
+        але воркери повертають лише зведення своїх вікон (encoding "stats").
+        Для кількох діапазонів блоки ділять відрізки їхнього об'єднання
+        (range_pieces), тож спільна частина просіюється один раз, а зведення
+        діапазону зшивається з його блоків у порядку (merge_prime_stats).
+        """
+        workers_to_use = self.select_workers(max_workers)
+        self.execution_mode = "PARALLEL" if workers_to_use else "SEQUENTIAL"
+        self.num_workers_used = len(workers_to_use)
+        backend_name = get_sieve_backend(self.options.get("backend")).name
+        moduli = [int(m) for m in self.options.get("stats_moduli", ",".join(str(m) for m in STATS_MODULI)).split(",")
+                  if m.strip()]
+        if any(m < 1 for m in moduli):
+            raise ValueError("Residue moduli must be positive: %s" % self.options["stats_moduli"])
+        print("=" * 60)
+        print("MODE: PRIME STATISTICS (%s, %d workers)" % (self.execution_mode, self.num_workers_used))
+        print("=" * 60)
+        tree = self.reduce_tree_plan(workers_to_use) if workers_to_use else None
+        if tree:
+            workers_to_use = [workers_to_use[i] for i, _, _ in tree]
+        self.algorithm_used = "Segmented Sieve of Eratosthenes with on-worker statistics (backend: %s)" % backend_name
+        if tree:
+            self.algorithm_used += ", reduce tree with fan-in %d" % int(self.options.get("fan_in", DEFAULT_FAN_IN))
+        
+        start_time = time.time()
+        blocks = {}
+        worker_times = worker_details = None
+        if workers_to_use:
+            scheduler, profile = self.create_scheduler(start, end, workers_to_use, tree)
+            args = (backend_name, STATS_ENCODING) + self.sieve_call_args(end) + (moduli,)
+
+            def submit(index, result):
+                blocks[index] = result.envelope()
+            worker_times, _, worker_details = self.map_blocks(workers_to_use, tree, scheduler, args, submit,
+                                                              profile=profile)
+            if scheduler.error is not None:
+                raise RuntimeError(scheduler.error)
+        else:
+            args = (backend_name, STATS_ENCODING, self.options.get("local_processes"), None,
+                    self.options.get("segment_size"), moduli)
+            stream_chunk = int(self.options.get("stream_chunk", STREAM_CHUNK_SIZE))
+            for index, lo, hi in self.plan_blocks(start, end, stream_chunk):
+                with self.tracer.span("compute", block=index):
+                    blocks[index] = Solver.find_primes_in_range(str(lo), str(hi), *args)
+        results = [blocks[index] for index in sorted(blocks)]
+        if self.ranges:
+            summaries = [merge_prime_stats(results[first:last + 1] if first is not None else [], a, b)
+                         for a, b, first, last in self.range_blocks]
+        else:
+            summaries = [merge_prime_stats(results, start, end)]
+        # Блоки не перетинаються, тож їхня сума - кількість різних простих в об'єднанні діапазонів
+        total = sum(int(r["count"]) for r in results)
+        traffic = sum(int(r.get("payload_bytes", 0)) for r in results)
+        elapsed_ms = (time.time() - start_time) * 1000
+        
+        f = open(self.output_file_name, 'w')
+        self.write_header(f, elapsed_ms, worker_times, worker_details)
+        f.write("PRIME STATISTICS:\n")
+        f.write("-" * 70 + "\n")
+        for k, summary in enumerate(summaries):
+            if k:
+                f.write("\n")
+            self.write_prime_stats(f, summary, moduli)
+        f.write("-" * 70 + "\n")
+        if self.ranges:
+            f.write("Ranges: %d\n" % len(self.ranges))
+            f.write("Sum over ranges: %d\n" % sum(summary["count"] for summary in summaries))
+            f.write("Total primes found: %d (distinct primes in the union of ranges)\n" % total)
+        f.write("Worker summaries: %d (%d bytes)\n" % (len(results), traffic))
+        f.write("=" * 70 + "\n")
+        f.close()
+        print("output done - file written to: %s" % self.output_file_name)
+        
+        print("")
+        print("=" * 70)
+        print("PERFORMANCE SUMMARY - PRIME STATISTICS")
+        print("=" * 70)
+        print("Range: [%d, %d]" % (start, end))
+        print("Algorithm: %s" % self.algorithm_used)
+        for i, wt in enumerate(worker_times or []):
+            print("  Worker %d: %s" % (i, format_time(wt)))
+        print("Worker summaries: %d blocks, %d bytes" % (len(results), traffic))
+        print("Execution time: %s" % format_time(elapsed_ms))
+        print("=" * 70)
+        print("")
+        print("Computation finished. Found %d primes" % total)
+        self.write_trace()
+        print("Job Finished")
+
+    @staticmethod
+    def write_prime_stats(f, summary, moduli):
+        """Записує зведення merge_prime_stats одного діапазону у вихідний файл."""
+        data = summary["data"]
+        f.write("Range: [%d, %d]\n" % (summary["start"], summary["end"]))
+        f.write("Total primes found: %d\n" % summary["count"])
+        if not summary["count"]:
+            return
+        f.write("First prime: %d\n" % summary["first"])
+        f.write("Last prime: %d\n" % summary["last"])
+        f.write("Sum of primes: %d\n" % data["sum"])
+        f.write("Twin prime pairs (p, p + 2): %d\n" % data["twins"])
+        if data["max_gap_start"] is not None:
+            f.write("Maximal gap: %d (between %d and %d)\n" %
+                    (data["max_gap"], data["max_gap_start"], data["max_gap_start"] + data["max_gap"]))
+        for modulus in moduli:
+            counts = data["residues"].get(str(modulus), {})
+            f.write("Primes by residue mod %d: %s\n" %
+                    (modulus, ", ".join("%s: %d" % (r, counts[r]) for r in sorted(counts, key=int))))
+
+    def check_primality(self, numbers, workers=None):
+        """
+        Перевіряє простоту пакета чисел, розподіляючи його між воркерами
+        так само, як solve розподіляє діапазон: рівні послідовні частини,
+        по одній на воркера. Кожна частина передається упакованою (uint64),
+        а воркер повертає бітову карту результатів.
+        Повертає (бітова карта для всіх чисел, час кожного воркера у мс).
+        """
+        if workers is None:
+            workers = self.select_workers(None)
+        parts = max(len(workers), 1)
+        # Довжина частини кратна 8, щоб бітові карти склеювались побайтово
+        part_size = ((len(numbers) + parts - 1) // parts + 7) // 8 * 8
+        calls = []
+        for lo in xrange(0, len(numbers), max(part_size, 8)):
+            part = numbers[lo:lo + part_size]
+            if all(0 <= n < (1 << 64) for n in part):
+                calls.append(("is_prime_batch", (pack_uint64(part),)))
+            else:
+                calls.append(("is_prime_batch", ([str(n) for n in part],)))
+        results, worker_times = self.run_tasks(workers, calls)
+        bitmap = bytearray()
+        for result in results:
+            bitmap += payload_bytes(result)
+        return bytes(bitmap), worker_times
+
+    def solve_primality(self, max_workers):
+        """
+        Режим mode=test: перевіряє простоту всіх чисел з вхідного файлу
+        (Міллер-Рабін на воркерах, понад MR_DETERMINISTIC_LIMIT - BPSW) і записує ті, що є простими.
+        """
+        numbers = self.test_numbers
+        workers_to_use = self.select_workers(max_workers)
+        self.execution_mode = "PARALLEL" if workers_to_use else "SEQUENTIAL"
+        self.num_workers_used = len(workers_to_use)
+        self.algorithm_used = "Deterministic Miller-Rabin (batch, small-prime pre-filter)"
+        if any(n >= MR_DETERMINISTIC_LIMIT for n in self.test_numbers):
+            self.algorithm_used = ("Miller-Rabin (batch, small-prime pre-filter; deterministic below 3.3e24, "
+                                   "BPSW probable-prime test above)")
+        print("=" * 60)
+        print("MODE: BATCH PRIMALITY TEST (%s, %d workers)" % (self.execution_mode, self.num_workers_used))
+        print("Candidates: %d" % len(numbers))
+        print("=" * 60)
+        start_time = time.time()
+        bitmap, worker_times = self.check_primality(numbers, workers_to_use)
+        elapsed_ms = (time.time() - start_time) * 1000
+        
+        f = open(self.output_file_name, 'w')
+        self.write_header(f, elapsed_ms, worker_times if self.execution_mode == "PARALLEL" else None)
+        f.write("PRIME CANDIDATES:\n")
+        f.write("-" * 70 + "\n")
+        primes = (str(n) for n, flag in zip(numbers, iter_bitmap(bitmap, len(numbers))) if flag)
+        total = write_prime_strings(f, primes)
+        if not total:
+            f.write("No primes found")
+        f.write("\n")
+        f.write("\n" + "-" * 70 + "\n")
+        f.write("Total candidates: %d\n" % len(numbers))
+        f.write("Total primes found: %d\n" % total)
+        f.write("=" * 70 + "\n")
+        f.close()
+        print("output done - file written to: %s" % self.output_file_name)
+        
+        print("")
+        print("=" * 70)
+        print("PERFORMANCE SUMMARY - BATCH PRIMALITY TEST")
+        print("=" * 70)
+        print("Candidates: %d" % len(numbers))
+        print("Algorithm: %s" % self.algorithm_used)
+        for i, wt in enumerate(worker_times if self.execution_mode == "PARALLEL" else []):
+            print("  Worker %d: %s" % (i, format_time(wt)))
+        print("Execution time: %s" % format_time(elapsed_ms))
+        print("=" * 70)
+        print("")
+        print("Computation finished. Found %d primes" % total)
+        self.write_trace()
+        print("Job Finished")
+
+    @staticmethod
+    @expose
+    def is_prime_batch(numbers):
+        """
+        Пакетна перевірка простоти на воркері. numbers - список цілих (або рядків)
+        чи упакований буфер uint64 (pack_uint64). Використовує пробне ділення на
+        малі прості та miller_rabin (понад MR_DETERMINISTIC_LIMIT - тест BPSW).
+        Повертає бітову карту: біт i (молодший біт першим) = 1, якщо numbers[i] просте.
+        """
+        start_time = time.time()
+        if isinstance(numbers, (list, tuple)):
+            numbers = [int(n) for n in numbers]
+        else:
+            numbers = unpack_uint64(numbers)
+        bitmap = bytearray((len(numbers) + 7) // 8)
+        for i, n in enumerate(numbers):
+            if miller_rabin(n):
+                bitmap[i >> 3] |= 1 << (i & 7)
+        print("Primality batch of %d numbers: %s" % (len(numbers), format_time((time.time() - start_time) * 1000)))
+        return bytes(bitmap)
+
+    @staticmethod
+    @expose
+    def count_primes_in_range(start_str, end_str, backend_name=None):
+        """Повертає лише кількість простих чисел у [start, end] (решето + підрахунок бітів)."""
+        return Solver.sieve_packed(int(start_str), int(end_str), SEGMENT_SIZE, backend_name).count()
+
+    @staticmethod
+    @expose
+    def calibrate(end_str, window=CALIBRATION_WINDOW):
+        """
+        Калібрування вузла для автотюнера: просіює вікно з window чисел біля end
+        кожним доступним бекендом (крім повільного python) для кожного розміру
+        сегмента з TUNE_SEGMENT_SIZES. Повертає {"host", "rates": {бекенд:
+        {розмір сегмента: чисел/мс}}, "cpu_count", "elapsed_ms"}.
+        """
+        end = max(int(end_str), window)
+        start = max(end - window + 1, 2)
+        calibration_start = time.time()
+        # Базові прості обчислюються один раз і не входять у виміри
+        Solver.base_primes(sieve_prime_limit(end))
+        rates = {}
+        for name in SIEVE_BACKENDS:
+            if name == "python" or (name == "numpy" and np is None):
+                continue
+            rates[name] = {}
+            for segment_size in TUNE_SEGMENT_SIZES:
+                best_ms = None
+                for _ in xrange(2):
+                    sieve_start = time.time()
+                    Solver.sieve_packed(start, end, segment_size, name)
+                    elapsed_ms = (time.time() - sieve_start) * 1000
+                    best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+                rates[name][str(segment_size)] = (end - start + 1) / max(best_ms, 1e-3)
+        elapsed_ms = (time.time() - calibration_start) * 1000
+        print("Calibration of %s near %d: %s" % (socket.gethostname(), end, format_time(elapsed_ms)))
+        return {"host": socket.gethostname(), "rates": rates, "cpu_count": local_process_count(),
+                "elapsed_ms": elapsed_ms}
+
+    @staticmethod
+    @expose
+    def reduce_tree(method, children, start_str, end_str, *args):
+        """
+        Вузол деревоподібного reduce: ділить [start, end] між собою і піддеревами
+        children ([uri воркера, його діти], ...) пропорційно їхньому розміру,
+        викликає дочірні вузли паралельно, сам виконує method(lo, hi, *args) для
+        своєї частини і повертає один злитий результат (merge_tree_results).
+        Частину дочірнього вузла, що не відповів, вузол обчислює сам.
+        """
+        if method not in TREE_METHODS:
+            raise ValueError("Method %s cannot be run as a reduce tree" % method)
+        start = int(start_str)
+        end = int(end_str)
+        if start > end:
+            return getattr(Solver, method)(start_str, end_str, *args)
+        start_time = time.time()
+        parts = aligned_partition(start, end, [1] + [tree_size(c) for _, c in children])
+        results = [None] * len(parts)
+
+        def run_child(k, uri, grandchildren):
+            lo, hi = parts[k]
+            try:
+                with Proxy(uri) as child:
+                    results[k] = child.reduce_tree(method, grandchildren, str(lo), str(hi), *args)
+            except Exception as e:
+                print("Child %s failed on [%d, %d]: %s; computing locally" % (uri, lo, hi, str(e)))
+                results[k] = getattr(Solver, method)(str(lo), str(hi), *args)
+
+        threads = []
+        for k, (uri, grandchildren) in enumerate(children, 1):
+            if parts[k][0] <= parts[k][1]:
+                thread = threading.Thread(target=run_child, args=(k, uri, grandchildren))
+                thread.start()
+                threads.append(thread)
+        if parts[0][0] <= parts[0][1]:
+            results[0] = getattr(Solver, method)(str(parts[0][0]), str(parts[0][1]), *args)
+        for thread in threads:
+            thread.join()
+        merge_start = time.time()
+        merged = merge_tree_results(method, [r for k, r in enumerate(results) if parts[k][0] <= parts[k][1]],
+                                    start, end)
+        merge_ms = (time.time() - merge_start) * 1000
+        if isinstance(merged, dict):
+            merged["compute_ms"] = (merge_start - start_time) * 1000
+            merged["serialize_ms"] += merge_ms
+        print("Reduce tree node: [%d, %d] over %d workers, merged %d results in %s" %
+              (start, end, tree_size(children), len(threads) + 1, format_time(merge_ms)))
+        return merged
+
+    @staticmethod
+    @expose
+    def prime_count_phi(x_str, i_start, i_step):
+        """
+        Фаза φ методу Мейсселя-Лемера на воркері:
+        повертає Σ φ(x / p_i, i - 1) для i = i_start, i_start + i_step, ... <= a.
+        """
+        start_time = time.time()
+        counter = PrimeCounter.get(int(x_str))
+        result = counter.phi_terms(int(i_start), int(i_step))
+        print("phi terms from %d step %d for x = %s: %s" % (i_start, i_step, x_str, format_time((time.time() - start_time) * 1000)))
+        return result
+
+    @staticmethod
+    @expose
+    def prime_count_segment(x_str, lo_str, hi_str, backend_name=None):
+        """
+        Фаза P2 методу Мейсселя-Лемера на воркері: просіює [lo, hi] і повертає
+        [кількість простих у сегменті, [кількість простих у [lo, q] для кожної
+        точки q = x / p_i з цього сегмента, у порядку зростання]].
+        """
+        start_time = time.time()
+        lo = int(lo_str)
+        hi = int(hi_str)
+        counter = PrimeCounter.get(int(x_str))
+        queries = [q for q, i in counter.p2_queries() if lo <= q <= hi]
+        backend = get_sieve_backend(backend_name)
+        local_counts = []
+        total = 0
+        q = 0
+        low = max(lo, 2)
+        while low <= hi:
+            high = min(low + SEGMENT_SIZE - 1, hi)
+            is_prime = backend.mark_segment(low, high, counter.primes)
+            while q < len(queries) and queries[q] <= high:
+                local_counts.append(total + backend.count_range(is_prime, 0, queries[q] - low + 1))
+                q += 1
+            total += backend.count_range(is_prime, 0, high - low + 1)
+            low = high + 1
+        print("P2 segment [%d, %d] for x = %s: %s" % (lo, hi, x_str, format_time((time.time() - start_time) * 1000)))
+        return [total, local_counts]
+
     @staticmethod
     @expose
-    def find_primes_in_range(start_str, end_str):
+    def find_primes_in_range(start_str, end_str, backend_name=None, encoding=None, processes=None, base_table=None,
+                             segment_size=None, stats_moduli=None):
         """
         Знаходить прості числа в заданому діапазоні.
         Виконується на worker node або послідовно.
-        Використовує решето Ератосфена для малих діапазонів,
-        перевірку кожного числа для великих діапазонів.
-        Повертає кортеж: (список простих чисел, назва алгоритму)
+        Використовує сегментоване решето Ератосфена: просіюється лише вікно
+        [start, end], тому пам'ять не залежить від величини end.
+        backend_name обирає реалізацію решета ("numpy", "bytearray", "python").
+        Великі вікна діляться між processes процесами локального пулу
+        (за замовчуванням - усі ядра вузла, див. sieve_parallel).
+        base_table - таблиця базових простих від майстра (BasePrimeCache.export).
+        segment_size - розмір сегмента (за замовчуванням SEGMENT_SIZE, див. автотюнер).
+        Без encoding повертає список простих чисел (рядками).
+        З encoding ("text", "varint", "bitmap") повертає словник-конверт з
+        закодованими даними, кількістю простих, часом обчислення та серіалізації.
+        З encoding "stats" конверт замість простих містить їхнє зведення
+        (prime_stats, лишки за модулями stats_moduli) - кілька сотень байтів.
         """
         start = int(start_str)
         end = int(end_str)
+        backend = get_sieve_backend(backend_name)
+        segment_size = int(segment_size) if segment_size else SEGMENT_SIZE
+        if base_table is not None:
+            BASE_PRIMES.load(base_table)
         
         print("Processing range [%d, %d]" % (start, end))
         
-        # Межа для використання решета Ератосфена (10 мільйонів)
-        # Решето ефективне для малих діапазонів через O(n) пам'яті
-        SIEVE_LIMIT = 10000000
-        
         # Визначаємо розмір діапазону
         range_size = end - start + 1
         
-        # Для малих діапазонів використовуємо решето Ератосфена
-        if end <= SIEVE_LIMIT:
-            algorithm_name = "Sieve of Eratosthenes"
-            print("-" * 60)
-            print("ALGORITHM: Sieve of Eratosthenes")
-            print("Reason: end (%d) <= SIEVE_LIMIT (%d)" % (end, SIEVE_LIMIT))
-            print("Range size: %d" % range_size)
-            print("Complexity: O(n log log n) time, O(n) memory")
-            print("-" * 60)
-            start_time = time.time()
-            primes = Solver.sieve_of_eratosthenes(start, end)
-            end_time = time.time()
-            elapsed_ms = (end_time - start_time) * 1000
-            print("Sieve of Eratosthenes execution time: %s" % format_time(elapsed_ms))
+        print("-" * 60)
+        print("ALGORITHM: Segmented Sieve of Eratosthenes")
+        print("Sieve backend: %s" % backend.name)
+        print("Range size: %d" % range_size)
+        print("Segment size: %d" % segment_size)
+        print("Base primes limit: %d" % sieve_prime_limit(end))
+        if sieve_prime_limit(end) < isqrt(max(end, 0)):
+            print("High-offset window: %s" % high_offset_label(end))
+        print("Complexity: O(n log log n) time, O(√end + segment) memory")
+        print("-" * 60)
+        processes = local_process_count(processes)
+        start_time = time.time()
+        if processes > 1 and range_size >= LOCAL_POOL_MIN_RANGE:
+            store = Solver.sieve_parallel(start, end, processes, backend.name, segment_size)
         else:
-            # Для великих діапазонів використовуємо перевірку кожного числа
-            algorithm_name = "Prime Checking (trial division)"
-            print("-" * 60)
-            print("ALGORITHM: Prime Checking (trial division)")
-            print("Reason: end (%d) > SIEVE_LIMIT (%d)" % (end, SIEVE_LIMIT))
-            print("Range size: %d" % range_size)
-            print("Complexity: O(n√n) time, O(k) memory (k = number of primes)")
-            print("-" * 60)
-            start_time = time.time()
-            primes = Solver.find_primes_by_checking(start, end)
-            end_time = time.time()
-            elapsed_ms = (end_time - start_time) * 1000
-            print("Prime checking algorithm execution time: %s" % format_time(elapsed_ms))
-        
-        print("Found %d primes" % len(primes))
-        # Зберігаємо назву алгоритму в першому елементі списку (якщо це воркер)
-        # Для послідовного режиму це буде збережено в self.algorithm_used
-        return primes
+            store = Solver.sieve_packed(start, end, segment_size, backend.name)
+        end_time = time.time()
+        elapsed_ms = (end_time - start_time) * 1000
+        print("Segmented sieve execution time: %s" % format_time(elapsed_ms))
+        print("Packed sieve size: %d bytes" % len(store.bits))
+        print("Base prime cache: %s" % BASE_PRIMES.stats())
+        
+        if encoding is None:
+            primes = [str(p) for p in store]
+            print("Found %d primes" % len(primes))
+            return primes
+        
+        serialize_start = time.time()
+        data, count, first, last = encode_prime_result(store, encoding,
+                                                       [int(m) for m in stats_moduli or STATS_MODULI])
+        serialize_ms = (time.time() - serialize_start) * 1000
+        if encoding == "text":
+            # Оцінка розміру списку рядків у serpent: цифри + лапки та роздільник
+            size = sum(len(p) for p in data) + 4 * count
+        elif encoding == STATS_ENCODING:
+            size = len(json.dumps(data))
+        else:
+            size = len(data)
+        print("Found %d primes" % count)
+        print("Result encoding: %s, payload %d bytes, serialization time %s" % (encoding, size, format_time(serialize_ms)))
+        return {
+            "encoding": encoding,
+            "start": start,
+            "end": end,
+            "count": count,
+            "first": first,
+            "last": last,
+            "data": data,
+            "backend": backend.name,
+            "compute_ms": elapsed_ms,
+            "serialize_ms": serialize_ms,
+            "payload_bytes": size,
+        }
+
+    @staticmethod
+    def base_primes(limit):
+        """
+        Повертає список базових простих чисел (int) від 2 до limit включно.
+        Використовується сегментованим решетом; limit зазвичай дорівнює √end.
+        Таблиця береться з кешу процесу BASE_PRIMES і не перераховується між викликами.
+        """
+        primes = BASE_PRIMES.get(limit)
+        return primes[:bisect_right(primes, limit)]
+
+    @staticmethod
+    def iter_segments(start, end, segment_size=SEGMENT_SIZE, backend_name=None, base_primes=None, limit=None):
+        """
+        Ядро сегментованого решета: видає (low, is_prime) для послідовних
+        сегментів вікна [start, end], де is_prime - прапорці простоти бекенду
+        для чисел [low, low + len(is_prime) - 1]. Наступний сегмент просіюється
+        лише на запит, тож одночасно в пам'яті один сегмент.
+        limit - межа базових простих (за замовчуванням sieve_prime_limit(end));
+        частина більшого вікна отримує межу всього вікна.
+        base_primes - готові базові прості до limit (інакше обчислюються).
+        Якщо limit < √end (режим високого зміщення), вцілілі після неповного
+        решета числа перевіряються miller_rabin.
+        """
+        low = max(start, 2)
+        if low > end:
+            return
+        backend = get_sieve_backend(backend_name)
+        if limit is None:
+            limit = sieve_prime_limit(end)
+        if base_primes is None:
+            base_primes = Solver.base_primes(limit)
+        # Складені числа до (межа решета)^2 уже викреслені, вище - лише кандидати
+        verify_from = (base_primes[-1] if base_primes else 1) ** 2 if limit < isqrt(end) else None
+        while low <= end:
+            high = min(low + segment_size - 1, end)
+            is_prime = backend.mark_segment(low, high, base_primes)
+            if verify_from is not None and high >= verify_from:
+                for n in backend.collect(is_prime, low):
+                    if n >= verify_from and not miller_rabin(n):
+                        is_prime[n - low] = False
+            yield low, is_prime
+            low = high + 1
+
+    @staticmethod
+    def sieve_packed(start, end, segment_size=SEGMENT_SIZE, backend_name=None, base_primes=None, limit=None):
+        """
+        Сегментоване решето з упакованим результатом: кожен сегмент iter_segments
+        відразу пакується у PackedWheelSieve.
+        Пам'ять: O(√end + segment_size) на просіювання плюс (end - start) / 30 байтів результату.
+        """
+        store = PackedWheelSieve(start, end)
+        if max(start, 2) > end:
+            return store
+        backend = get_sieve_backend(backend_name)
+        for low, is_prime in Solver.iter_segments(start, end, segment_size, backend.name, base_primes, limit):
+            store.add_segment(low, is_prime, backend)
+        return store
+
+    @staticmethod
+    def sieve_parallel(start, end, processes, backend_name=None, segment_size=SEGMENT_SIZE):
+        """
+        Ділить [start, end] на processes частин з межами, кратними 30, і
+        просіює їх у локальному пулі процесів. Кожна частина займає цілі байти
+        колеса, тож упаковані біти частин просто зшиваються у порядку.
+        Межа базових простих і режим (повне чи неповне решето) визначаються
+        один раз для всього вікна: частина з меншим кінцем інакше могла б
+        обрати повне решето з таблицею пулу, обрізаною до PARTIAL_SIEVE_LIMIT.
+        """
+        bounds = [start]
+        for chunk_start, _ in split_range(start, end, processes)[1:]:
+            boundary = (chunk_start // WHEEL_MODULUS) * WHEEL_MODULUS
+            if boundary > bounds[-1]:
+                bounds.append(boundary)
+        bounds.append(end + 1)
+        limit = sieve_prime_limit(end)
+        tasks = [(bounds[i], bounds[i + 1] - 1, backend_name, segment_size, limit) for i in xrange(len(bounds) - 1)]
+        pool = get_local_pool(processes, limit)
+        bits = bytearray()
+        for i, (lo, hi, part, elapsed_ms, pid) in enumerate(pool.map(_sieve_subrange, tasks)):
+            print("  Process %d (pid %d): [%d, %d] sieved in %s" % (i, pid, lo, hi, format_time(elapsed_ms)))
+            bits += part
+        return PackedWheelSieve(start, end, bits)
+
+    @staticmethod
+    @expose
+    def segmented_sieve(start, end, segment_size=SEGMENT_SIZE, backend_name=None):
+        """
+        Сегментоване решето Ератосфена для пошуку простих чисел у діапазоні [start, end].
+        Просіює лише вікно [start, end] блоками по segment_size чисел,
+        викреслюючи кратні базових простих чисел до √end.
+        Складність: O(n log log n) за часом, O(√end + segment_size) за пам'яттю.
+        """
+        return [str(p) for p in Solver.sieve_packed(start, end, segment_size, backend_name)]
 
     @staticmethod
     @expose
-    def sieve_of_eratosthenes(start, end):
+    def sieve_of_eratosthenes(start, end, backend_name=None):
         """
         Решето Ератосфена для пошуку простих чисел у діапазоні [start, end].
-        Складність: O(n log log n) за часом, O(n) за пам'яттю.
-        Ефективне для малих діапазонів.
+        Просіює весь діапазон одним блоком за допомогою обраного бекенду
+        (див. get_sieve_backend) і пакує результат у колесо mod 30.
+        Складність: O(n log log n) за часом, O(end - start + √end) за пам'яттю.
         """
-        if end < 2:
-            return []
-        if start > end:
-            return []
-        
-        # Створюємо масив булевих значень розміром end + 1
-        # is_prime[i] = True означає, що i є простим числом
-        limit = end
-        is_prime = [True] * (limit + 1)
-        is_prime[0] = False
-        is_prime[1] = False
-        
-        # Для кожного числа i від 2 до √limit
-        sqrt_limit = int(math.sqrt(limit)) + 1
-        for i in xrange(2, sqrt_limit):
-            if is_prime[i]:
-                # Позначаємо всі кратні i як непрості
-                for j in xrange(i * i, limit + 1, i):
-                    is_prime[j] = False
-        
-        # Збираємо всі прості числа у діапазоні [start, end]
-        primes = []
-        for num in xrange(max(2, start), end + 1):
-            if is_prime[num]:
-                primes.append(str(num))
-        
-        return primes
+        size = max(end - max(start, 2) + 1, 1)
+        return [str(p) for p in Solver.sieve_packed(start, end, size, backend_name)]
     
     @staticmethod
     def find_primes_by_checking(start, end):
         """
         Знаходить прості числа перевіркою кожного числа.
-        Використовується для великих діапазонів.
-        Складність: O(n√n) за часом, O(k) за пам'яттю (де k - кількість простих чисел).
+        Кожне число ділиться лише на прості до його кореня з кешу BASE_PRIMES.
+        Складність: O(n√n / ln n) за часом, O(k + √end / ln end) за пам'яттю
+        (де k - кількість простих чисел).
         """
         primes = []
         
@@ -425,6 +3709,12 @@ class Solver:
         if start % 2 == 0:
             start += 1
         
+        # Таблиця дільників отримується один раз на весь діапазон; для далеких
+        # вікон (√end > WINDOW_SIEVE_LIMIT) кожне число перевіряє miller_rabin
+        if isqrt(max(end, 0)) > WINDOW_SIEVE_LIMIT:
+            return primes + [str(n) for n in xrange(start, end + 1, 2) if miller_rabin(n)]
+        divisors = Solver.base_primes(isqrt(max(end, 0)))
+        
         # Використовуємо xrange для сумісності з Python 2 (якщо потрібно)
         num_range = xrange(start, end + 1, 2)
         
@@ -434,7 +3724,7 @@ class Solver:
         count = 0
         
         for num in num_range:
-            if Solver.is_prime(num):
+            if Solver.has_no_divisor(num, divisors):
                 primes.append(str(num))
             count += 1
             if count % step_report == 0:
@@ -442,49 +3732,246 @@ class Solver:
                 print("Progress: %d%% (%d/%d)" % (progress, count, total))
         
         return primes
+
+    @staticmethod
+    def has_no_divisor(n, divisors):
+        """Чи є n > 1 простим: divisors - прості у порядку зростання, що покривають √n."""
+        if n < 2:
+            return False
+        for p in divisors:
+            if p * p > n:
+                break
+            if n % p == 0:
+                return False
+        return True
     
     @staticmethod
     @expose
     def is_prime(n):
         """
         Перевіряє, чи є число простим.
-        Перевіряє ділення на числа від 2 до √n.
+        Ділить лише на прості від 2 до √n з кешу BASE_PRIMES; якщо √n більший
+        за WINDOW_SIEVE_LIMIT, використовує miller_rabin.
         """
-        if n < 2:
-            return False
-        if n == 2:
-            return True
-        if n % 2 == 0:
-            return False
-        
-        sqrt_n = int(math.sqrt(n)) + 1
-        # Використовуємо xrange для сумісності з Python 2 (якщо потрібно)
-        i_range = xrange(3, sqrt_n, 2)
-        
-        for i in i_range:
-            if n % i == 0:
-                return False
-        return True
+        if isqrt(max(n, 0)) > WINDOW_SIEVE_LIMIT:
+            return miller_rabin(n)
+        return Solver.has_no_divisor(n, BASE_PRIMES.get(isqrt(max(n, 0))))
 
     @staticmethod
     @expose
     def myreduce(mapped):
         """
         Об'єднує результати з усіх workers.
+        Приймає списки рядків, конверти find_primes_in_range або PrimeResult;
+        повертає PrimeChain, що декодує результати ліниво.
+        Зведення mode=stats (у порядку діапазону) зливаються в одне зведення.
         """
         print("reduce")
-        output = []
+        parts = []
+        # Результат від Pyro4 може бути об'єктом з атрибутом value (для async)
+        mapped = [primes.value if hasattr(primes, 'value') else primes for primes in mapped]
+        if mapped and all(isinstance(primes, dict) and primes.get("encoding") == STATS_ENCODING for primes in mapped):
+            print("reduce done")
+            return merge_prime_stats(mapped, mapped[0]["start"], mapped[-1]["end"])
         
         for primes in mapped:
             print("reduce loop")
-            # Результат від Pyro4 може бути або списком, або об'єктом з атрибутом value (для async)
-            if hasattr(primes, 'value'):
-                output = output + primes.value
-            else:
-                # Якщо це вже список
-                output = output + primes
+            if isinstance(primes, dict):
+                primes = PrimeResult(primes)
+            elif not isinstance(primes, PrimeResult):
+                # Якщо це список рядків
+                primes = PrimeResult.from_list(primes)
+            parts.append(primes)
         print("reduce done")
-        return output
+        return PrimeChain(parts)
+
+    def write_trace(self):
+        """Записує спани фаз у файл з параметра trace (trace_format=json|chrome)."""
+        path = self.options.get("trace")
+        if not path or not self.tracer.enabled:
+            return
+        trace_format = self.options.get("trace_format", "json")
+        self.tracer.write(path, trace_format)
+        print("Trace (%s, %d spans) written to: %s" % (trace_format, len(self.tracer.spans), path))
+
+    def call_timeout(self):
+        """
+        Таймаут одного виклику воркера в секундах: параметр timeout або поле
+        timeout з parcs_config.json (поруч із розв'язком або в робочому каталозі).
+        """
+        if "timeout" in self.options:
+            return float(self.options["timeout"]) or None
+        for path in (os.path.join(os.path.dirname(os.path.abspath(__file__)), PARCS_CONFIG_FILE), PARCS_CONFIG_FILE):
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r') as f:
+                        return float(json.load(f).get("timeout", 0)) or None
+                except (IOError, OSError, ValueError, TypeError, AttributeError) as e:
+                    print("WARNING: ignoring unreadable %s: %s" % (path, str(e)))
+        return None
+
+    def tuning_profile_path(self):
+        """Шлях до профілю автотюнера (параметр tune_profile, none - не зберігати)."""
+        path = self.options.get("tune_profile")
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(self.output_file_name)), TUNING_PROFILE_FILE)
+        return None if path == "none" else path
+
+    def autotune(self, start, end, workers):
+        """
+        Автотюнер (параметр tune=auto|recalibrate): калібрує хости, яких ще немає
+        у профілі (майстер - локально, воркери - викликом Solver.calibrate),
+        і за профілем заповнює не задані явно параметри backend, segment_size,
+        scheduler=dynamic та grain. Повертає True, якщо прогнозований час
+        локального виконання не більший за паралельний (з round-trip викликів).
+        """
+        tune = self.options.get("tune", "off")
+        if tune not in TUNE_MODES:
+            raise ValueError("Unknown tune mode: %s" % tune)
+        if tune == "off":
+            return False
+        profile = TuningProfile(self.tuning_profile_path())
+        bucket = TuningProfile.bucket(end)
+        local_key = "master@%s" % socket.gethostname()
+        if tune == "recalibrate" or profile.get(local_key, bucket) is None:
+            entry = Solver.calibrate(str(end))
+            entry["roundtrip_ms"] = 0.0
+            profile.set(local_key, bucket, entry)
+        keys = [TuningProfile.host_key(w, i) for i, w in enumerate(workers)]
+        missing = []
+        seen = set()
+        for i, key in enumerate(keys):
+            if key not in seen and (tune == "recalibrate" or profile.get(key, bucket) is None):
+                missing.append(i)
+            seen.add(key)
+        if missing:
+            print("Auto-tune: calibrating %d hosts" % len(missing))
+            try:
+                results, call_ms = self.run_tasks([workers[i] for i in missing],
+                                                  [("calibrate", (str(end),)) for _ in missing], pinned=True)
+            except Exception as e:
+                print("WARNING: calibration failed, running without auto-tuning: %s" % str(e))
+                return False
+            for i, entry, wall_ms in zip(missing, results, call_ms):
+                entry["roundtrip_ms"] = max(wall_ms - entry["elapsed_ms"], 0.0)
+                profile.set(keys[i], bucket, entry)
+        profile.save()
+        if "backend" in self.options:
+            self.options["backend"] = get_sieve_backend(self.options["backend"]).name
+        
+        local = profile.get(local_key, bucket)
+        entries = [profile.get(key, bucket) for key in keys]
+        processes = self.options.get("local_processes")
+        total = sum(hi - lo + 1 for lo, hi in range_pieces(self.ranges)) if self.ranges else end - start + 1
+        if entries:
+            # Бекенд і сегмент з найбільшою сумарною пропускною здатністю, доступні на всіх вузлах
+            names = set(entries[0]["rates"])
+            for entry in entries[1:]:
+                names &= set(entry["rates"])
+            backend, segment_size = max(((name, int(size)) for name in names for size in entries[0]["rates"][name]),
+                                        key=lambda choice: sum(e["rates"][choice[0]].get(str(choice[1]), 0.0)
+                                                               for e in entries))
+            backend = self.options.get("backend", backend)
+            segment_size = int(self.options.get("segment_size", segment_size))
+
+            def worker_rate_for(task_size):
+                return sum(host_rate(e, backend, task_size, processes) for e in entries) / len(entries)
+            # Задача на ~TUNE_TASK_MS, але не менше TUNE_MIN_TASKS задач на воркера;
+            # задачі, менші за LOCAL_POOL_MIN_RANGE, воркер просіює в одному процесі
+            max_grain = total // (TUNE_MIN_TASKS * len(entries)) + 1
+            grain = min(int(worker_rate_for(LOCAL_POOL_MIN_RANGE) * TUNE_TASK_MS), max_grain)
+            if grain < LOCAL_POOL_MIN_RANGE:
+                grain = min(int(worker_rate_for(0) * TUNE_TASK_MS), max_grain)
+            grain = (max(grain, TUNE_MIN_GRAIN) + WHEEL_MODULUS - 1) // WHEEL_MODULUS * WHEEL_MODULUS
+            if self.options.get("scheduler", "dynamic") == "dynamic":
+                task_size = int(self.options.get("grain", grain))
+            else:
+                task_size = min(total // len(entries) + 1, int(self.options.get("stream_chunk", STREAM_CHUNK_SIZE)))
+            worker_rate = worker_rate_for(task_size)
+            roundtrip_ms = sum(e.get("roundtrip_ms", 0.0) for e in entries) / len(entries)
+            parallel_ms = total / (worker_rate * len(entries)) + roundtrip_ms
+        else:
+            backend, segment_size, _ = best_rate(local)
+            parallel_ms = None
+        local_backend, local_segment, local_rate = best_rate(local, self.options.get("backend"))
+        if not local_rate:
+            local_backend, local_segment, _ = best_rate(local)
+        # Послідовний режим просіює блоки по stream_chunk чисел
+        local_block = min(total, int(self.options.get("stream_chunk", STREAM_CHUNK_SIZE)))
+        local_ms = total / host_rate(local, local_backend, local_block, processes)
+        run_local = parallel_ms is None or local_ms <= parallel_ms
+        if run_local:
+            self.options.setdefault("backend", local_backend)
+            self.options.setdefault("segment_size", str(local_segment))
+            self.tune_summary = "local run (predicted %s vs %s with workers), backend %s, segment %d" % (
+                format_time(local_ms), format_time(parallel_ms) if parallel_ms is not None else "n/a",
+                self.options["backend"], int(self.options["segment_size"]))
+        else:
+            self.options.setdefault("backend", backend)
+            self.options.setdefault("segment_size", str(segment_size))
+            self.options.setdefault("scheduler", "dynamic")
+            self.options.setdefault("grain", str(grain))
+            self.tune_summary = "parallel run (predicted %s vs %s locally), backend %s, segment %d, scheduler %s" % (
+                format_time(parallel_ms), format_time(local_ms), self.options["backend"],
+                int(self.options["segment_size"]), self.options["scheduler"])
+            if self.options["scheduler"] == "dynamic":
+                self.tune_summary += ", grain %s" % self.options["grain"]
+        print("Auto-tune: %s" % self.tune_summary)
+        return run_local
+
+    def cost_profile_path(self):
+        """Шлях до профілю швидкостей воркерів (параметр cost_profile, none - не зберігати)."""
+        path = self.options.get("cost_profile")
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(self.output_file_name)), COST_PROFILE_FILE)
+        return None if path == "none" else path
+
+    def create_segment_cache(self):
+        """
+        Дисковий кеш блоків або None. Кеш займає (end - start) / 30 байтів на
+        завдання, тож вмикається лише явно: параметр segment_cache - каталог кешу.
+        """
+        path = self.options.get("segment_cache")
+        if path is None or path == "none":
+            return None
+        return SegmentCache(path)
+
+    def create_result_writer(self, max_pending=MAX_PENDING_CHUNKS):
+        """
+        Створює потоковий reduce для поточного завдання відповідно до
+        параметра output_format: "text" (список у вихідному файлі),
+        "binary" (двійковий файл <output>.bin з індексом <output>.bin.idx,
+        а вихідний файл містить лише статистику) або "both".
+        """
+        output_format = self.options.get("output_format", "text")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Unknown output format: %s" % output_format)
+        binary = None
+        if output_format in ("binary", "both"):
+            binary = BinaryPrimeWriter(self.output_file_name + ".bin")
+        return OrderedResultWriter(self.output_file_name + ".primes.tmp", max_pending,
+                                   text=(output_format != "binary"), binary=binary,
+                                   sections=bool(self.ranges))
+
+    def plan_blocks(self, start, end, size):
+        """
+        Задачі (index, block_start, block_end) не більше size чисел у порядку діапазону.
+        Для завдання з кількома діапазонами ділиться їхнє об'єднання (range_pieces),
+        тож кожен блок цілком усередині або поза кожним діапазоном, і для кожного
+        діапазону запам'ятовуються його блоки (self.range_blocks).
+        """
+        if not self.ranges:
+            return split_blocks(start, end, size)
+        blocks = []
+        for lo, hi in range_pieces(self.ranges):
+            blocks.extend(split_blocks(lo, hi, size, len(blocks)))
+        block_starts = [lo for _, lo, _ in blocks]
+        self.range_blocks = []
+        for a, b in self.ranges:
+            first = bisect_left(block_starts, a)
+            last = bisect_right(block_starts, b) - 1
+            self.range_blocks.append((a, b, first, last) if first <= last else (a, b, None, None))
+        return blocks
 
     def read_input(self):
         """
@@ -492,28 +3979,73 @@ class Solver:
         Формат: 
         - перший рядок - початок діапазону
         - другий рядок - кінець діапазону
-        - третій рядок (опціонально) - максимальна кількість workers (1, 2, або 3)
+        - третій рядок (опціонально) - максимальна кількість workers
+        - далі (опціонально) - параметри у вигляді key=value, наприклад:
+          backend=numpy|bytearray|python|auto
+        Параметри зберігаються у self.options. Порожні рядки та рядки,
+        що починаються з '#', ігноруються.
+        Рядки range=a-b (можна кілька пар через кому і кілька таких рядків)
+        задають завдання з кількома діапазонами (self.ranges); тоді єдиний
+        числовий рядок - кількість workers, а пара рядків start/end, якщо є,
+        додається як ще один діапазон. Повертаються межі об'єднання.
+        У режимі mode=test усі числові рядки (числа можна розділяти пробілами
+        або комами) - кандидати для перевірки простоти (self.test_numbers),
+        а кількість workers задається параметром workers=N; повертаються
+        start = end = None.
         """
         try:
             f = open(self.input_file_name, 'r')
-            start = int(f.readline().strip())
-            end = int(f.readline().strip())
+            values = []
+            options = {}
+            ranges = []
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    if key.strip().lower() == "range":
+                        ranges.extend(parse_ranges(value))
+                    else:
+                        options[key.strip().lower()] = value.strip()
+                else:
+                    values.append(line)
+            f.close()
             
-            # Читаємо третій рядок (кількість workers), якщо він є
-            third_line = f.readline().strip()
+            if ranges and options.get("mode") != "test":
+                if len(values) >= 2:
+                    ranges.insert(0, (int(values[0]), int(values[1])))
+                    values = values[2:]
+                self.ranges = ranges
+                start = min(a for a, _ in ranges)
+                end = max(b for _, b in ranges)
+                third_line = values[0] if values else ''
+                print("Ranges: %d requested, %d numbers after merging" %
+                      (len(ranges), sum(hi - lo + 1 for lo, hi in range_pieces(ranges))))
+            elif options.get("mode") == "test":
+                self.test_numbers = [int(token) for line in values for token in line.replace(',', ' ').split()]
+                start = end = None
+                third_line = ''
+            else:
+                start = int(values[0])
+                end = int(values[1])
+                # Третій рядок (кількість workers), якщо він є
+                third_line = values[2] if len(values) > 2 else ''
+            if "workers" in options:
+                third_line = options["workers"]
             max_workers = None
             if third_line:
                 try:
                     max_workers = int(third_line)
-                    if max_workers < 1:
+                    if max_workers < 0:
                         max_workers = None
-                    elif max_workers > 3:
-                        max_workers = 3  # Обмежуємо максимум 3 workers
                     print("Requested workers: %d" % max_workers)
                 except ValueError:
                     max_workers = None
             
-            f.close()
+            self.options = options
+            for key in sorted(options):
+                print("Option: %s = %s" % (key, options[key]))
             return start, end, max_workers
         except Exception as e:
             print("ERROR reading input file: %s" % str(e))
@@ -521,64 +4053,148 @@ class Solver:
             traceback.print_exc()
             raise
 
-    def write_output(self, output, execution_time_ms=None, worker_times=None):
+    def write_header(self, f, execution_time_ms=None, worker_times=None, worker_details=None):
+        """
+        Записує заголовок вихідного файлу: режим виконання, алгоритм, час
+        та детальну статистику воркерів.
+        """
+        # Додаємо заголовок з інформацією про алгоритм
+        f.write("=" * 70 + "\n")
+        f.write("INFORMATION ABOUT COMPUTATION\n")
+        f.write("=" * 70 + "\n")
+        f.write("Execution Mode: %s\n" % (self.execution_mode if self.execution_mode else "UNKNOWN"))
+        if self.execution_mode == "PARALLEL":
+            f.write("Number of Workers Used: %d\n" % self.num_workers_used)
+        f.write("Algorithm Used: %s\n" % (self.algorithm_used if self.algorithm_used else "UNKNOWN"))
+        if execution_time_ms is not None:
+            f.write("Total Execution Time: %s\n" % format_time(execution_time_ms))
+        if self.cache_summary:
+            f.write("Segment Cache: %s\n" % self.cache_summary)
+        if self.tune_summary:
+            f.write("Auto-Tuning: %s\n" % self.tune_summary)
+
+        # Детальна інформація про воркерів (для паралельного режиму)
+        if self.execution_mode == "PARALLEL" and worker_times:
+            f.write("\n")
+            f.write("PARALLEL EXECUTION DETAILS:\n")
+            f.write("-" * 70 + "\n")
+            total_sequential_time = sum(worker_times)
+            f.write("Individual Worker Execution Times:\n")
+            for i, wt in enumerate(worker_times):
+                f.write("  Worker %d: %s\n" % (i, format_time(wt)))
+            if worker_details:
+                f.write("\n")
+                encoding = STATS_ENCODING if self.options.get("mode") == "stats" else self.options.get("encoding", "text")
+                f.write("Per-Worker Timing Breakdown (result encoding: %s):\n" % encoding)
+                for i, details in enumerate(worker_details):
+                    if details:
+                        f.write("  Worker %d: compute %s | serialize %s | transfer+overhead %s | payload %d bytes\n" %
+                                (i, format_time(details["compute_ms"]), format_time(details["serialize_ms"]),
+                                 format_time(details["transfer_ms"]), details["payload_bytes"]))
+                if all(details and "tasks" in details for details in worker_details):
+                    f.write("\n")
+                    f.write("Load Balance (scheduler: %s):\n" % self.options.get("scheduler", "static"))
+                    for i, details in enumerate(worker_details):
+                        f.write("  Worker %d: %d tasks, idle %s\n" % (i, details["tasks"], format_time(details["idle_ms"])))
+                if self.fault_summary:
+                    f.write("Fault tolerance: %s\n" % self.fault_summary)
+            f.write("\n")
+            f.write("Performance Metrics:\n")
+            f.write("  Longest worker time: %s\n" % format_time(max(worker_times)))
+            f.write("  Average worker time: %s\n" % format_time(sum(worker_times) / len(worker_times)))
+            f.write("  Total sequential time (if run one by one): %s\n" % format_time(total_sequential_time))
+            f.write("  Total parallel execution time: %s\n" % format_time(execution_time_ms if execution_time_ms else 0))
+            if len(worker_times) > 1:
+                speedup = total_sequential_time / max(worker_times) if max(worker_times) > 0 else 1.0
+                efficiency = speedup / len(worker_times) * 100
+                f.write("  Speedup: %.3fx\n" % speedup)
+                f.write("  Efficiency: %.2f%%\n" % efficiency)
+                f.write("\n")
+                f.write("COMPARISON:\n")
+                f.write("  Sequential execution (1 worker): ~%s\n" % format_time(total_sequential_time))
+                f.write("  Parallel execution (%d workers): %s\n" % (len(worker_times), format_time(execution_time_ms if execution_time_ms else 0)))
+                if execution_time_ms and total_sequential_time > 0:
+                    time_saved = total_sequential_time - execution_time_ms
+                    percent_saved = (time_saved / total_sequential_time) * 100
+                    f.write("  Time saved: %s (%.2f%%)\n" % (format_time(time_saved), percent_saved))
+
+        f.write("=" * 70 + "\n")
+        f.write("\n")
+
+    def write_range_sections(self, f, output):
+        """
+        Завдання з кількома діапазонами: окрема секція для кожного діапазону
+        у порядку вхідного файлу (прості числа - лише у текстовому форматі).
+        """
+        f.write("PRIME NUMBERS BY RANGE:\n")
+        for a, b, first, last in self.range_blocks:
+            f.write("-" * 70 + "\n")
+            f.write("Range [%d, %d]:\n" % (a, b))
+            if first is None:
+                count = 0
+            elif output.text:
+                count = output.copy_section(f, first, last)
+            else:
+                count = output.section_count(first, last)
+            if output.text:
+                f.write("%s\n" % ("" if count else "No primes found"))
+            f.write("Primes in range: %d\n" % count)
+        f.write("-" * 70 + "\n")
+        f.write("Ranges: %d\n" % len(self.range_blocks))
+        f.write("Total primes found: %d (distinct primes in the union of ranges)\n" % output.count)
+        f.write("=" * 70 + "\n")
+
+    def write_output(self, output, execution_time_ms=None, worker_times=None, worker_details=None):
         """
         Записує результати у файл з інформацією про використаний алгоритм та детальну статистику.
         """
         try:
             f = open(self.output_file_name, 'w')
             
-            # Додаємо заголовок з інформацією про алгоритм
-            f.write("=" * 70 + "\n")
-            f.write("INFORMATION ABOUT COMPUTATION\n")
-            f.write("=" * 70 + "\n")
-            f.write("Execution Mode: %s\n" % (self.execution_mode if self.execution_mode else "UNKNOWN"))
-            if self.execution_mode == "PARALLEL":
-                f.write("Number of Workers Used: %d\n" % self.num_workers_used)
-            f.write("Algorithm Used: %s\n" % (self.algorithm_used if self.algorithm_used else "UNKNOWN"))
-            if execution_time_ms is not None:
-                f.write("Total Execution Time: %s\n" % format_time(execution_time_ms))
+            self.write_header(f, execution_time_ms, worker_times, worker_details)
             
-            # Детальна інформація про воркерів (для паралельного режиму)
-            if self.execution_mode == "PARALLEL" and worker_times:
-                f.write("\n")
-                f.write("PARALLEL EXECUTION DETAILS:\n")
-                f.write("-" * 70 + "\n")
-                total_sequential_time = sum(worker_times)
-                f.write("Individual Worker Execution Times:\n")
-                for i, wt in enumerate(worker_times):
-                    f.write("  Worker %d: %s\n" % (i, format_time(wt)))
-                f.write("\n")
-                f.write("Performance Metrics:\n")
-                f.write("  Longest worker time: %s\n" % format_time(max(worker_times)))
-                f.write("  Average worker time: %s\n" % format_time(sum(worker_times) / len(worker_times)))
-                f.write("  Total sequential time (if run one by one): %s\n" % format_time(total_sequential_time))
-                f.write("  Total parallel execution time: %s\n" % format_time(execution_time_ms if execution_time_ms else 0))
-                if len(worker_times) > 1:
-                    speedup = total_sequential_time / max(worker_times) if max(worker_times) > 0 else 1.0
-                    efficiency = speedup / len(worker_times) * 100
-                    f.write("  Speedup: %.3fx\n" % speedup)
-                    f.write("  Efficiency: %.2f%%\n" % efficiency)
+            # output - OrderedResultWriter (потоковий reduce), список рядків
+            # або PrimeResult/PrimeChain; рядки пишемо порціями
+            if isinstance(output, OrderedResultWriter):
+                total = output.count
+                if output.binary is not None:
+                    f.write("BINARY PRIME FILE:\n")
+                    f.write("-" * 70 + "\n")
+                    f.write("Data file: %s\n" % output.binary.path)
+                    f.write("Index file: %s\n" % output.binary.index_path)
+                    f.write("Format: blocks of %d varint-delta primes, sparse index (see PrimeIndexReader)\n" %
+                            output.binary.block_primes)
                     f.write("\n")
-                    f.write("COMPARISON:\n")
-                    f.write("  Sequential execution (1 worker): ~%s\n" % format_time(total_sequential_time))
-                    f.write("  Parallel execution (%d workers): %s\n" % (len(worker_times), format_time(execution_time_ms if execution_time_ms else 0)))
-                    if execution_time_ms and total_sequential_time > 0:
-                        time_saved = total_sequential_time - execution_time_ms
-                        percent_saved = (time_saved / total_sequential_time) * 100
-                        f.write("  Time saved: %s (%.2f%%)\n" % (format_time(time_saved), percent_saved))
-            
-            f.write("=" * 70 + "\n")
-            f.write("\n")
+                if not output.text:
+                    if self.range_blocks is not None:
+                        self.write_range_sections(f, output)
+                        f.close()
+                        print("output done - file written to: %s" % self.output_file_name)
+                        return
+                    f.write("Total primes found: %d\n" % total)
+                    f.write("=" * 70 + "\n")
+                    f.close()
+                    print("output done - file written to: %s" % self.output_file_name)
+                    return
+            else:
+                total = len(output)
+            if self.range_blocks is not None and isinstance(output, OrderedResultWriter):
+                self.write_range_sections(f, output)
+                f.close()
+                print("output done - file written to: %s" % self.output_file_name)
+                return
             f.write("PRIME NUMBERS FOUND:\n")
             f.write("-" * 70 + "\n")
-            
-            # output вже список рядків
-            if output and len(output) > 0:
-                f.write(', '.join(output))
+            if total > 0:
+                if isinstance(output, OrderedResultWriter):
+                    output.copy_to(f)
+                elif isinstance(output, PrimeResult):
+                    write_prime_strings(f, output.strings())
+                else:
+                    write_prime_strings(f, output)
                 f.write('\n')
                 f.write("\n" + "-" * 70 + "\n")
-                f.write("Total primes found: %d\n" % len(output))
+                f.write("Total primes found: %d\n" % total)
             else:
                 f.write('No primes found\n')
             f.write("=" * 70 + "\n")
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+Регресійні тести prime_solution (python -m pytest або python -m unittest).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+import unittest
+
+import serpent
+from Pyro4.futures import FutureResult, _ExceptionWrapper
+
+import prime_solution
+from prime_solution import (Solver, BasePrimeCache, BASE_PRIMES, AsyncChannel, PrimeResult, BinaryPrimeWriter,
+                            PrimeIndexReader, TaskScheduler, split_blocks, merge_prime_stats, miller_rabin)
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def quiet(function, *args):
+    """Викликає function без виводу Solver у stdout."""
+    saved_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return function(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = saved_stdout
+
+
+def reference_primes(start, end):
+    """Прості у [start, end]: решето Ератосфена до 10^7, вище - miller_rabin."""
+    if end >= 10 ** 7:
+        return [n for n in range(start, end + 1) if miller_rabin(n)]
+    sieve = bytearray([1]) * (end + 1)
+    sieve[:2] = bytearray(min(2, end + 1))
+    for p in range(2, int(end ** 0.5) + 1):
+        if sieve[p]:
+            sieve[p * p::p] = bytearray(len(range(p * p, end + 1, p)))
+    return [n for n in range(start, end + 1) if sieve[n]]
+
+
+class LocalWorker(object):
+    """Замінник Pyro4-проксі воркера: методи Solver виконуються у цьому процесі."""
+
+    def __getattr__(self, name):
+        return getattr(Solver, name)
+
+
+class FailingWorker(object):
+    """Замінник воркера, чий вузол недоступний: кожен виклик завершується помилкою."""
+
+    def __getattr__(self, name):
+        def call(*args):
+            raise IOError("node died")
+        return call
+
+
+class HighOffsetThresholdTest(unittest.TestCase):
+    """Вікно навколо (2^22 + 1)^2, де √end перетинає WINDOW_SIEVE_LIMIT."""
+
+    THRESHOLD = ((1 << 22) + 1) ** 2
+
+    def test_local_pool_matches_single_process(self):
+        start = self.THRESHOLD - 300000
+        end = self.THRESHOLD + 100000
+        single = quiet(Solver.sieve_packed, start, end)
+        pooled = quiet(Solver.sieve_parallel, start, end, 4)
+        self.assertEqual(pooled.count(), single.count())
+        self.assertEqual(pooled.bits, single.bits)
+
+
+class ResultEncodingTest(unittest.TestCase):
+
+    RANGES = [(0, 1), (0, 100), (2, 2), (29, 31), (1000, 1097), (999000, 1001234), (10 ** 12, 10 ** 12 + 5000)]
+
+    def decode(self, start, end, encoding):
+        envelope = quiet(Solver.find_primes_in_range, str(start), str(end), None, encoding)
+        # Як на майстрі: конверт проходить через серіалізатор serpent, з яким працює Pyro4
+        return PrimeResult(serpent.loads(serpent.dumps(envelope)))
+
+    def test_varint_and_bitmap_round_trip(self):
+        for start, end in self.RANGES:
+            expected = reference_primes(start, end)
+            for encoding in ("varint", "bitmap"):
+                result = self.decode(start, end, encoding)
+                self.assertEqual(len(result), len(expected), (start, end, encoding))
+                self.assertEqual(list(result), expected, (start, end, encoding))
+                self.assertEqual(list(result.strings()), [str(p) for p in expected])
+
+
+class PrimeIndexReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.primes = reference_primes(0, 200000)
+        path = os.path.join(self.directory, "primes.bin")
+        writer = BinaryPrimeWriter(path, block_primes=64)
+        # Порції не збігаються з межами блоків
+        for k in range(0, len(self.primes), 1000):
+            writer.write(self.primes[k:k + 1000])
+        writer.close()
+        self.reader = PrimeIndexReader(path)
+
+    def tearDown(self):
+        self.reader.close()
+        shutil.rmtree(self.directory)
+
+    def test_nth(self):
+        self.assertEqual(len(self.reader), len(self.primes))
+        for k in (1, 2, 63, 64, 65, 128, 129, 1000, len(self.primes) - 1, len(self.primes)):
+            self.assertEqual(self.reader.nth(k), self.primes[k - 1], k)
+        self.assertRaises(IndexError, self.reader.nth, len(self.primes) + 1)
+
+    def test_primes_between(self):
+        block_first = self.primes[64]
+        for a, b in ((0, 1), (0, 30), (block_first, block_first), (block_first - 1, block_first + 500),
+                     (90000, 90100), (114, 126), (199000, 250000), (300000, 400000), (50, 40)):
+            self.assertEqual(list(self.reader.primes_between(a, b)),
+                             [p for p in self.primes if a <= p <= b], (a, b))
+
+
+class MultiRangeOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def solve(self, workers, lines):
+        """Виконує завдання з рядками вхідного файлу lines; повертає вміст вихідного файлу."""
+        input_path = os.path.join(self.directory, "input.txt")
+        output_path = os.path.join(self.directory, "output.txt")
+        with open(input_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        quiet(quiet(Solver, workers, input_path, output_path).solve)
+        with open(output_path) as f:
+            return f.read()
+
+    def test_overlapping_ranges_get_own_sections(self):
+        ranges = [(1, 100), (90, 120), (50, 40), (1, 10)]
+        for workers in ([], [LocalWorker(), LocalWorker()]):
+            output = self.solve(workers, ["range=1-100, 90-120, 50-40, 1-10", str(len(workers))])
+            sections = output.split("PRIME NUMBERS BY RANGE:\n")[1].split("-" * 70 + "\n")[1:]
+            for (a, b), section in zip(ranges, sections):
+                primes = reference_primes(a, b) if a <= b else []
+                self.assertEqual(section, "Range [%d, %d]:\n%s\nPrimes in range: %d\n" %
+                                 (a, b, ", ".join(str(p) for p in primes) or "No primes found", len(primes)))
+            self.assertIn("Ranges: 4\nTotal primes found: 30 (distinct primes in the union of ranges)\n", output)
+
+    def test_overlapping_ranges_stats_total_union(self):
+        output = self.solve([LocalWorker(), LocalWorker()], ["range=1-100, 90-120", "2", "mode=stats"])
+        self.assertIn("Range: [90, 120]\nTotal primes found: 6\n", output)
+        self.assertIn("Sum over ranges: 31\nTotal primes found: 30 (distinct primes in the union of ranges)\n", output)
+
+
+class PrimeStatsMergeTest(unittest.TestCase):
+
+    def window(self, start, end):
+        return quiet(Solver.find_primes_in_range, str(start), str(end), None, "stats")
+
+    def assertMergedEqualsWhole(self, bounds):
+        """Зведення вікон bounds, злиті merge_prime_stats, дорівнюють зведенню одного вікна."""
+        start, end = bounds[0][0], bounds[-1][1]
+        merged = merge_prime_stats([self.window(lo, hi) for lo, hi in bounds], start, end)
+        whole = self.window(start, end)
+        for key in ("count", "first", "last", "data"):
+            self.assertEqual(merged[key], whole[key], key)
+        return merged
+
+    def test_twin_pair_across_boundary(self):
+        # 101 і 103 потрапляють у різні вікна
+        merged = self.assertMergedEqualsWhole([(1, 102), (103, 200)])
+        self.assertEqual(merged["data"]["twins"],
+                         self.window(1, 102)["data"]["twins"] + self.window(103, 200)["data"]["twins"] + 1)
+
+    def test_max_gap_across_boundary(self):
+        # Найбільша різниця до 10^6 (114, між 492113 і 492227) охоплює порожнє вікно
+        merged = self.assertMergedEqualsWhole([(492000, 492150), (492151, 492226), (492227, 492400)])
+        self.assertEqual((merged["data"]["max_gap"], merged["data"]["max_gap_start"]), (114, 492113))
+
+
+class PrimalityTest(unittest.TestCase):
+
+    def test_strong_pseudoprime_to_first_13_primes(self):
+        # Найменше складене число, що проходить Міллера-Рабіна за основами 2..41
+        self.assertFalse(miller_rabin(3317044064679887385961981))
+
+    def test_large_primes_and_composites(self):
+        for p in (2 ** 89 - 1, 2 ** 107 - 1, 2 ** 127 - 1):
+            self.assertTrue(miller_rabin(p))
+            self.assertFalse(miller_rabin(p * (2 ** 61 - 1)))
+
+
+class BasePrimeCacheTest(unittest.TestCase):
+
+    def test_loaded_table_covers_exported_limit(self):
+        for limit in (100, 10000, 65535, 65536, 200000):
+            cache = BasePrimeCache()
+            cache.load(BASE_PRIMES.export(limit))
+            primes = cache.get(limit)
+            self.assertEqual(cache.misses, 0, limit)
+            self.assertEqual(primes[:10], [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+            self.assertEqual(primes, BASE_PRIMES.get(limit)[:len(primes)])
+
+
+class PrimeCountTest(unittest.TestCase):
+
+    def count(self, x, workers):
+        return quiet(quiet(Solver).count_primes_upto, x, workers)[0]
+
+    def test_meissel_lehmer_below_direct_limit(self):
+        # π(10^6) зазвичай просіюється напряму; тут рахується Мейсселем-Лемером
+        saved_limit = prime_solution.COUNT_DIRECT_LIMIT
+        prime_solution.COUNT_DIRECT_LIMIT = 0
+        try:
+            self.assertEqual(self.count(10 ** 6, []), 78498)
+            self.assertEqual(self.count(10 ** 6, [LocalWorker(), LocalWorker()]), 78498)
+        finally:
+            prime_solution.COUNT_DIRECT_LIMIT = saved_limit
+
+    def test_meissel_lehmer_distributed(self):
+        self.assertEqual(self.count(10 ** 9, [LocalWorker(), LocalWorker(), LocalWorker()]), 50847534)
+
+
+class TaskSchedulerTest(unittest.TestCase):
+
+    def finish(self, scheduler, worker_idx, task, elapsed_ms=1.0):
+        """Завершує задачу воркера; повертає, чи це перший результат блоку."""
+        first = scheduler.task_done(worker_idx, task, elapsed_ms)
+        if first:
+            scheduler.commit(task)
+        return first
+
+    def test_dynamic_queue_feeds_fast_worker(self):
+        tasks = split_blocks(1, 1000, 100)
+        scheduler = TaskScheduler(2, tasks=list(reversed(tasks)), speculate=0)
+        held = scheduler.next_task(1, wait=False)
+        taken = []
+        task = scheduler.next_task(0, wait=False)
+        while task is not None:
+            taken.append(task)
+            self.assertTrue(self.finish(scheduler, 0, task))
+            task = scheduler.next_task(0, wait=False)
+        # Задачі видаються у порядку index, і вільний воркер бере наступну
+        self.assertEqual([held] + taken, tasks)
+        self.assertFalse(scheduler.finished())
+        self.finish(scheduler, 1, held, 50.0)
+        self.assertTrue(scheduler.finished())
+        self.assertEqual(scheduler.task_counts, [9, 1])
+        self.assertEqual(scheduler.idle_ms(0, 100.0), 91.0)
+        self.assertEqual(scheduler.idle_ms(1, 100.0), 50.0)
+
+    def test_failed_block_retried_on_other_worker(self):
+        first, second = split_blocks(1, 200, 100)
+        scheduler = TaskScheduler(2, tasks=[first, second], speculate=0)
+        self.assertEqual(scheduler.next_task(0, wait=False), first)
+        self.assertEqual(scheduler.next_task(1, wait=False), second)
+        scheduler.task_failed(0, first, 1.0)
+        # Повтор не дістається воркеру, на якому блок уже впав, поки є інші
+        self.assertIsNone(scheduler.next_task(0, wait=False))
+        self.assertEqual(scheduler.next_task(1, wait=False), first)
+        self.finish(scheduler, 1, second)
+        self.finish(scheduler, 1, first)
+        self.assertTrue(scheduler.finished())
+        self.assertIsNone(scheduler.error)
+        self.assertEqual((scheduler.failures, scheduler.retries), (1, 1))
+
+    def test_failing_worker_retired(self):
+        tasks = split_blocks(1, 300, 100)
+        scheduler = TaskScheduler(2, assignment=[tasks, []], speculate=0)
+        for _ in range(prime_solution.MAX_WORKER_FAILURES):
+            quiet(scheduler.task_failed, 0, scheduler.next_task(0, wait=False), 1.0)
+        self.assertEqual(scheduler.retired, set([0]))
+        self.assertIsNone(scheduler.next_task(0, wait=False))
+        # Решта задач виведеного воркера переходить іншим
+        done = []
+        task = scheduler.next_task(1, wait=False)
+        while task is not None:
+            self.finish(scheduler, 1, task)
+            done.append(task)
+            task = scheduler.next_task(1, wait=False)
+        self.assertEqual(sorted(done), tasks)
+        self.assertTrue(scheduler.finished())
+        self.assertIsNone(scheduler.error)
+
+    def test_block_aborts_after_max_attempts(self):
+        task, = split_blocks(1, 100, 100)
+        scheduler = TaskScheduler(2, tasks=[task], max_attempts=2, speculate=0)
+        scheduler.task_failed(0, scheduler.next_task(0, wait=False), 1.0)
+        scheduler.task_failed(1, scheduler.next_task(1, wait=False), 1.0)
+        self.assertTrue(scheduler.finished())
+        self.assertIn("failed after 2 attempts", scheduler.error)
+        self.assertIsNone(scheduler.next_task(0, wait=False))
+
+    def test_speculative_copy_wins_and_duplicate_discarded(self):
+        slow, fast = split_blocks(1, 200, 100)
+        saved_min_ms = prime_solution.SPECULATIVE_MIN_MS
+        prime_solution.SPECULATIVE_MIN_MS = 0
+        try:
+            scheduler = TaskScheduler(2, tasks=[slow, fast], speculate=1.0)
+            self.assertEqual(scheduler.next_task(0, wait=False), slow)
+            self.assertEqual(scheduler.next_task(1, wait=False), fast)
+            self.finish(scheduler, 1, fast, 1.0)
+            time.sleep(0.01)
+            copy = scheduler.next_task(1, wait=False)
+        finally:
+            prime_solution.SPECULATIVE_MIN_MS = saved_min_ms
+        self.assertEqual(copy, slow)
+        self.assertTrue(self.finish(scheduler, 1, copy))
+        self.assertFalse(self.finish(scheduler, 0, slow, 500.0))
+        self.assertTrue(scheduler.finished())
+        self.assertEqual((scheduler.speculative, scheduler.speculative_wins), (1, 1))
+
+    def test_cache_hit_records_no_rate(self):
+        task, = split_blocks(1, 100, 100)
+        scheduler = TaskScheduler(1, tasks=[task])
+        self.assertTrue(scheduler.commit_cached(0, scheduler.next_task(0, wait=False)))
+        scheduler.commit(task)
+        self.assertTrue(scheduler.finished())
+        self.assertEqual(scheduler.rates, [])
+
+    def test_run_tasks_retries_calls_of_dead_worker(self):
+        calls = [("count_primes_in_range", (str(lo), str(hi))) for _, lo, hi in split_blocks(1, 100000, 10000)]
+        results, _ = quiet(quiet(Solver).run_tasks, [FailingWorker(), LocalWorker()], calls)
+        self.assertEqual(sum(results), 9592)
+        self.assertRaises(IOError, quiet, quiet(Solver).run_tasks, [FailingWorker(), FailingWorker()], calls)
+
+
+class ReadyFutureProxy(object):
+    """Замінник асинхронного Pyro4-проксі, чий виклик повертає вже готовий FutureResult."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def _pyroAsync(self):
+        pass
+
+    def find_primes_in_range(self, *args):
+        future = FutureResult()
+        future.value = self.value
+        return future
+
+
+class AsyncChannelTest(unittest.TestCase):
+
+    def complete(self, value):
+        completions = queue.Queue()
+        AsyncChannel(ReadyFutureProxy(value), completions).call("tag", "find_primes_in_range", "1", "10")
+        result = completions.get(timeout=1)
+        self.assertTrue(completions.empty())
+        return result
+
+    def test_error_already_set_before_callbacks(self):
+        error = IOError("node died")
+        self.assertEqual(self.complete(_ExceptionWrapper(error)), ("tag", None, error))
+
+    def test_value_already_set_before_callbacks(self):
+        self.assertEqual(self.complete(["2", "3", "5", "7"]), ("tag", ["2", "3", "5", "7"], None))
+
+
+if __name__ == "__main__":
+    unittest.main()